@@ -0,0 +1,120 @@
+"""コンパクト形式(float32の座標と名前の番号)が、通常の形式と同じ結果を与えることの確認"""
+
+import io
+
+import numpy as np
+import pytest
+
+from xi.common.gromacs2 import read_gro
+from xi.common.graph2 import gro2atoms, hb_edges
+from xi.common.synth import ice_frame
+
+
+@pytest.fixture(scope="module", params=["Ih", "Ic"])
+def gro_text(request):
+    """約1000分子の氷と、それを乱した水の2フレームの.gro(トポロジーは同じ)"""
+    file = io.StringIO()
+    for disorder in (False, True):
+        ice_frame(request.param, 1000, disorder=disorder).write_gro(file)
+    return file.getvalue()
+
+
+def read(text, compact):
+    return list(read_gro(io.StringIO(text), compact=compact))
+
+
+def test_positions(gro_text):
+    for full, compact in zip(read(gro_text, False), read(gro_text, True)):
+        assert compact.position.dtype == np.float32
+        assert compact.residue_id.dtype == np.int32
+        assert compact.atom_id.dtype == np.int32
+        # .groの座標は小数点以下3桁なので、float32でも丸めの範囲におさまる。
+        np.testing.assert_allclose(compact.position, full.position, atol=1e-5)
+        np.testing.assert_array_equal(compact.cell, full.cell)
+
+
+def test_select(gro_text):
+    full = read(gro_text, False)[0]
+    compact = read(gro_text, True)[0]
+    for condition in (
+        dict(atom="OW"),
+        dict(atom="MW"),
+        dict(atom_prefix="HW"),
+        dict(residue="water", atom="HW1"),
+        dict(residue="SOL"),
+    ):
+        index = compact.select(**condition)
+        assert index.dtype == np.int32
+        np.testing.assert_array_equal(index, full.select(**condition))
+
+
+def test_topology_shared(gro_text):
+    first, second = read(gro_text, True)
+    assert second.atom_name is first.atom_name
+    assert second.name_table is first.name_table
+    assert second.select(atom="OW") is first.select(atom="OW")
+
+
+def test_hb_edges(gro_text):
+    frames = zip(read(gro_text, False), read(gro_text, True))
+    for i, (full, compact) in enumerate(frames):
+        o_full, h_full, cell = gro2atoms(full)
+        o_compact, h_compact, _ = gro2atoms(compact)
+        # セル相対座標は、通常の形式と同じfloat64の値にもどしてから求める。
+        np.testing.assert_array_equal(o_compact, o_full)
+        np.testing.assert_array_equal(h_compact, h_full)
+        expected = hb_edges(o_full, h_full, cell)
+        if i == 0:
+            # 氷は4配位なので、水素結合は分子数の2倍
+            assert len(expected) == 2 * len(o_full)
+        np.testing.assert_array_equal(hb_edges(o_compact, h_compact, cell), expected)
+        np.testing.assert_array_equal(
+            hb_edges(o_compact, h_compact, cell, memory_budget=200000), expected
+        )
+
+
+def test_write_gro(gro_text):
+    for full, compact in zip(read(gro_text, False), read(gro_text, True)):
+        a, b = io.StringIO(), io.StringIO()
+        full.write_gro(a)
+        compact.write_gro(b)
+        assert a.getvalue() == b.getvalue()
+
+
+@pytest.fixture(scope="module")
+def exact_text():
+    """水素と、ほかの分子の酸素とが、小数点以下3桁でちょうど0.25 nm離れた.gro
+
+    分子AのOWから見て、分子BのHW1をちょうど0.25 nmの位置に置く。float32の座標
+    のままセル相対座標にすると、この境目の対が通常の形式と食いちがいうる。
+    """
+    rng = np.random.default_rng(0)
+    offsets = np.array([[250, 0, 0], [150, 200, 0], [0, 70, 240], [-200, 0, -150]])
+    lines = []
+    # 1.2 nm間隔の格子の各点に、ずらした分子AとBを置く(単位は0.001 nm)。
+    for i, site in enumerate(np.ndindex(5, 5, 5)):
+        a = np.array(site) * 1200 + rng.integers(0, 300, 3)
+        b = a + offsets[i % len(offsets)]
+        molecules = [
+            [a, a + [0, 0, 100], a + [0, 100, 0]],
+            [b + [0, 500, 0], b, b + [0, 500, 100]],
+        ]
+        for atoms in molecules:
+            residue = len(lines) // 3 + 1
+            for name, position in zip(("OW", "HW1", "HW2"), atoms):
+                x, y, z = position / 1000
+                lines.append(
+                    f"{residue:5d}{'SOL':5s}{name:>5s}{len(lines) + 1:5d}"
+                    f"{x:8.3f}{y:8.3f}{z:8.3f}"
+                )
+    return "\n".join(["exact", str(len(lines)), *lines, "6.0 6.0 6.0", ""])
+
+
+def test_hb_edges_at_cutoff(exact_text):
+    (full,) = read(exact_text, False)
+    (compact,) = read(exact_text, True)
+    o_full, h_full, cell = gro2atoms(full)
+    o_compact, h_compact, _ = gro2atoms(compact)
+    expected = hb_edges(o_full, h_full, cell)
+    assert len(expected) > 0
+    np.testing.assert_array_equal(hb_edges(o_compact, h_compact, cell), expected)
@@ -0,0 +1,148 @@
+"""圧縮したトラジェクトリーを、圧縮していないものと同じに読めることの確認"""
+
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+from xi.common.compressed import (
+    BlockReader,
+    GroTrajectory,
+    compress_bgzf,
+    open_trajectory,
+)
+from xi.common.gromacs2 import read_gro
+from xi.common.synth import ice_frame
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+N_FRAMES = 8
+
+
+@pytest.fixture(scope="module")
+def gro_bytes():
+    """小さな氷を、配置を変えてN_FRAMES個ならべた.gro(数ブロック分の大きさ)"""
+    file = io.StringIO()
+    for seed in range(N_FRAMES):
+        ice_frame("Ic", 200, disorder=True, seed=seed).write_gro(file)
+    return file.getvalue().encode()
+
+
+@pytest.fixture(scope="module")
+def expected(gro_bytes):
+    return list(read_gro(io.StringIO(gro_bytes.decode())))
+
+
+def zstd_frames(data, size, **kwarg):
+    """sizeバイトずつ別のzstdフレームに圧縮してつなげる(pzstdと同じ形)"""
+    compressor = zstandard.ZstdCompressor(**kwarg)
+    return b"".join(
+        compressor.compress(data[i : i + size]) for i in range(0, len(data), size)
+    )
+
+
+def zstd_stream(data):
+    """内容の大きさを書かない、ストリームとして圧縮したzstd"""
+    compressor = zstandard.ZstdCompressor().compressobj()
+    return compressor.compress(data) + compressor.flush()
+
+
+def bgzf(data):
+    dst = io.BytesIO()
+    compress_bgzf(io.BytesIO(data), dst)
+    return dst.getvalue()
+
+
+# 拡張子、圧縮する関数、任意の位置に速くseekできる(BlockReaderで読む)かどうか
+FORMATS = {
+    "plain": (".gro", lambda data: data, False),
+    "gzip": (".gro.gz", gzip.compress, False),
+    "bgzf": (".gro.gz", bgzf, True),
+    "zstd-single": (
+        ".gro.zst",
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        False,
+    ),
+    "zstd-multi": (".gro.zst", lambda data: zstd_frames(data, 20000), True),
+    "zstd-no-size": (
+        ".gro.zst",
+        lambda data: zstd_frames(data, 20000, write_content_size=False),
+        False,
+    ),
+    "zstd-stream": (".gro.zst", zstd_stream, False),
+}
+
+
+@pytest.fixture(params=list(FORMATS))
+def compressed(request, gro_bytes, tmp_path):
+    """圧縮したファイルの名前と、BlockReaderで読むはずかどうか"""
+    if request.param.startswith("zstd") and zstandard is None:
+        pytest.skip("zstandard is not installed")
+    suffix, compress, blocks = FORMATS[request.param]
+    filename = tmp_path / f"traj{suffix}"
+    filename.write_bytes(compress(gro_bytes))
+    return str(filename), blocks
+
+
+def assert_same(frame, reference):
+    np.testing.assert_array_equal(frame.position, reference.position)
+    np.testing.assert_array_equal(frame.cell, reference.cell)
+
+
+def test_read(compressed, gro_bytes, expected):
+    filename, blocks = compressed
+    with open_trajectory(filename, "rb", threads=2) as f:
+        assert isinstance(getattr(f, "raw", None), BlockReader) == blocks
+        assert f.read() == gro_bytes
+    with open_trajectory(filename, threads=2) as f:
+        frames = list(read_gro(f))
+    assert len(frames) == len(expected)
+    for frame, reference in zip(frames, expected):
+        assert_same(frame, reference)
+
+
+def test_block_seek(compressed, gro_bytes):
+    filename, blocks = compressed
+    if not blocks:
+        pytest.skip("not block-compressed")
+    with open_trajectory(filename, "rb", threads=2) as f:
+        # ブロックの境目をまたいで、後ろから前へ読む。
+        for offset in (len(gro_bytes) - 100, 70000, 65279, 10, 0):
+            f.seek(offset)
+            assert f.read(200) == gro_bytes[offset : offset + 200]
+        f.seek(-50, io.SEEK_END)
+        assert f.read() == gro_bytes[-50:]
+
+
+def test_random_access(compressed, expected):
+    filename, _ = compressed
+    with GroTrajectory(filename, threads=2) as trajectory:
+        assert len(trajectory) == N_FRAMES
+        assert_same(trajectory[0], expected[0])
+        assert_same(trajectory[-1], expected[-1])
+        # 前にもどる読みかた
+        for i in (5, 2, 6, 1, 0, -2):
+            assert_same(trajectory[i], expected[i])
+        with pytest.raises(IndexError):
+            trajectory[N_FRAMES]
+        with pytest.raises(IndexError):
+            trajectory[-N_FRAMES - 1]
+
+
+def test_iterate(compressed, expected):
+    filename, _ = compressed
+    frames = list(GroTrajectory(filename, compact=True))
+    assert len(frames) == len(expected)
+    for frame, reference in zip(frames, expected):
+        np.testing.assert_allclose(frame.position, reference.position, atol=1e-5)
+
+
+def test_saved_offsets(compressed, expected):
+    filename, _ = compressed
+    offsets = GroTrajectory(filename).offsets
+    with GroTrajectory(filename, offsets=offsets) as trajectory:
+        assert_same(trajectory[3], expected[3])
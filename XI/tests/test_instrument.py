@@ -0,0 +1,29 @@
+"""計測器が、フレームごとの記録とプロセス全体の最大メモリを正しく残すことの確認"""
+
+import numpy as np
+
+from xi.common.instrument import Profiler, peak_memory
+
+
+def test_records():
+    profiler = Profiler()
+    profiler.enable()
+    for i in profiler.frames(range(3)):
+        with profiler.stage("work"):
+            profiler.count("items", i)
+    report = profiler.report()
+    assert [record["count"]["items"] for record in report["frames"]] == [0, 1, 2]
+    assert all(record["time"]["work"] >= 0 for record in report["frames"])
+    assert report["total"]["count"]["items"] == 3
+
+
+def test_peak_memory_kept():
+    profiler = Profiler()
+    profiler.enable()
+    # 最初のフレームで大きな配列をつくって捨てても、プロセス全体の最大値は残る。
+    for i in profiler.frames(range(3)):
+        if i == 0:
+            np.ones(1 << 25).sum()
+    before = peak_memory()
+    report = profiler.report()
+    assert report["total"]["peak_memory"] >= before >= (1 << 28)
@@ -0,0 +1,112 @@
+"""kernelsの関数の確認。Numbaがあれば、JITの版がnumpyの版と一致することも確かめる。"""
+
+import numpy as np
+import pytest
+
+from xi.common import kernels
+from xi.common.energy import energies_tip4pice
+from xi.common.graph2 import gro2atoms, hb_edges
+from xi.common.synth import ice_frame
+
+jit = pytest.mark.skipif(not kernels.HAVE_NUMBA, reason="numba is not installed")
+
+
+@pytest.fixture(scope="module", params=["Ih", "Ic"])
+def frame(request):
+    """約1000分子の、乱した氷の配置"""
+    return ice_frame(request.param, 1000, disorder=True)
+
+
+@pytest.fixture(scope="module")
+def network(frame):
+    """酸素のセル相対位置、水素結合(受容分子, 供与分子)、セル行列"""
+    rel_O, rel_H, cell = gro2atoms(frame)
+    return rel_O, hb_edges(rel_O, rel_H, cell)[:, ::-1], cell
+
+
+@pytest.fixture(scope="module")
+def waters(frame):
+    """分子ごとにOW, HW1, HW2, MWの順にならべた座標と、重心"""
+    sites = np.stack(
+        [frame.select(atom=name) for name in ("OW", "HW1", "HW2", "MW")], axis=1
+    )
+    positions = frame.position[sites]
+    com = (positions[:, 0] * 16 + positions[:, 1] + positions[:, 2]) / 18
+    return positions, com, frame.cell
+
+
+def test_bond_vectors(network):
+    rel_O, edges, cell = network
+    delta = kernels.bond_vectors(rel_O, edges, jit=False)
+    assert np.all(np.abs(delta) <= 0.5)
+    # 最小像をとれば、酸素間距離は水素との距離の上限(0.25 nm)とOH結合の和より短い。
+    assert np.all(np.linalg.norm(delta @ cell, axis=1) < 0.35)
+
+
+def test_bin_means():
+    bins = np.array([[1, 0, 0], [0, 0, 0], [1, 0, 0]])
+    values = np.array([[1.0, 0, 0], [2.0, 0, 0], [3.0, 0, 0]])
+    keys, means = kernels.bin_means(bins, values)
+    np.testing.assert_array_equal(keys, [[1, 0, 0], [0, 0, 0]])
+    np.testing.assert_allclose(means[:, 0], [2.0, 2.0])
+
+
+def test_use_jit_without_numba(monkeypatch):
+    monkeypatch.setattr(kernels, "HAVE_NUMBA", False)
+    assert not kernels.use_jit(False)
+    with pytest.raises(ImportError):
+        kernels.use_jit(True)
+
+
+def test_use_jit_broken_numba(monkeypatch, network):
+    def broken():
+        raise ImportError("numba is broken")
+
+    # 入っているがimportできないnumbaは、既定(jit=None)ではnumpyの版にもどる。
+    monkeypatch.setattr(kernels, "HAVE_NUMBA", True)
+    monkeypatch.setattr(kernels, "JIT", True)
+    monkeypatch.setattr(kernels, "_jitted", None)
+    monkeypatch.setattr(kernels, "_compile", broken)
+    assert not kernels.use_jit()
+    assert not kernels.JIT
+    rel_O, edges, cell = network
+    np.testing.assert_array_equal(
+        kernels.bond_vectors(rel_O, edges),
+        kernels.bond_vectors(rel_O, edges, jit=False),
+    )
+    with pytest.raises(ImportError):
+        kernels.use_jit(True)
+
+
+@jit
+def test_bond_vectors_jit(network):
+    rel_O, edges, cell = network
+    np.testing.assert_allclose(
+        kernels.bond_vectors(rel_O, edges, jit=True),
+        kernels.bond_vectors(rel_O, edges, jit=False),
+        rtol=1e-12,
+        atol=1e-12,
+    )
+
+
+@jit
+def test_bond_midpoint_bins_jit(network):
+    rel_O, edges, cell = network
+    delta, bins = kernels.bond_midpoint_bins(rel_O, edges, cell, 0.7, jit=True)
+    reference_delta, reference_bins = kernels.bond_midpoint_bins(
+        rel_O, edges, cell, 0.7, jit=False
+    )
+    np.testing.assert_allclose(delta, reference_delta, rtol=1e-12, atol=1e-12)
+    np.testing.assert_array_equal(bins, reference_bins)
+
+
+@jit
+# numpyの版は自分自身との相互作用をいったん0で割ってから除く。
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_energies_jit(waters):
+    positions, com, cell = waters
+    np.testing.assert_allclose(
+        energies_tip4pice(positions, com, cell, jit=True),
+        energies_tip4pice(positions, com, cell, jit=False),
+        rtol=1e-8,
+    )
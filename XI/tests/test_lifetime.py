@@ -0,0 +1,102 @@
+"""LifetimeTrackerとRingKeysを、定義どおりの素朴な計算と比べる。"""
+
+import numpy as np
+import pytest
+
+from xi.common.lifetime import LifetimeTracker, RingKeys, hb_keys
+
+
+def brute_force(frames, max_lag, max_lifetime):
+    """集合の時系列から、相関関数と寿命の分布を定義どおりに求める。"""
+    n = len(frames)
+    intermittent = np.zeros(max_lag + 1)
+    continuous = np.zeros(max_lag + 1)
+    origins = np.zeros(max_lag + 1)
+    for lag in range(min(max_lag, n - 1) + 1):
+        for t in range(lag, n):
+            origins[lag] += 1
+            intermittent[lag] += len(frames[t] & frames[t - lag])
+            # t-lagからtまでとぎれずに存在した項目
+            continuous[lag] += len(set.intersection(*frames[t - lag : t + 1]))
+    with np.errstate(invalid="ignore"):
+        intermittent /= origins
+        continuous /= origins
+    # 寿命: とぎれずに存在した区間の長さ(最後のフレームで打ち切り)
+    lifetimes = np.zeros(max_lifetime + 1, dtype=np.int64)
+    for item in set().union(*frames):
+        length = 0
+        for keys in frames + [set()]:
+            if item in keys:
+                length += 1
+            elif length > 0:
+                lifetimes[min(length, max_lifetime)] += 1
+                length = 0
+    return intermittent / intermittent[0], continuous / continuous[0], lifetimes
+
+
+def random_rings(rng, n_frames):
+    """少しずつ入れかわる環(向きや始点はばらばら)の列"""
+    pool = [
+        list(rng.choice(40, size=size, replace=False))
+        for size in rng.integers(3, 8, 60)
+    ]
+    present = rng.random(len(pool)) < 0.5
+    frames = []
+    for _ in range(n_frames):
+        present ^= rng.random(len(pool)) < 0.2
+        rings = []
+        for ring, p in zip(pool, present):
+            if p:
+                ring = list(np.roll(ring, rng.integers(len(ring))))
+                rings.append(ring[::-1] if rng.random() < 0.5 else ring)
+        frames.append(rings)
+    return frames
+
+
+def check(tracker, frames):
+    intermittent, continuous, lifetimes = brute_force(
+        frames, tracker.max_lag, len(tracker.lifetimes) - 1
+    )
+    tracker.finish()
+    observed = tracker.correlations()
+    np.testing.assert_allclose(observed[0], intermittent)
+    np.testing.assert_allclose(observed[1], continuous)
+    np.testing.assert_array_equal(tracker.lifetimes, lifetimes)
+
+
+@pytest.mark.parametrize("max_lag", [3, 30])
+def test_hb_lifetimes(max_lag):
+    rng = np.random.default_rng(0)
+    n_mol = 10
+    frames = []
+    tracker = LifetimeTracker(max_lag=max_lag, max_lifetime=8)
+    edges = rng.integers(n_mol, size=(30, 2))
+    for _ in range(20):
+        present = edges[rng.random(len(edges)) < 0.7]
+        tracker.update(hb_keys(present, n_mol))
+        frames.append(set(map(tuple, present.tolist())))
+    check(tracker, frames)
+
+
+def test_ring_lifetimes():
+    rng = np.random.default_rng(1)
+    ring_keys = RingKeys()
+    tracker = LifetimeTracker(max_lag=5, max_lifetime=10)
+    frames = []
+    for rings in random_rings(rng, 25):
+        tracker.update(ring_keys(rings))
+        frames.append(set(frozenset(ring) for ring in rings))
+    check(tracker, frames)
+
+
+def test_ring_keys_exact():
+    ring_keys = RingKeys()
+    first = ring_keys([[0, 1, 2, 3], [5, 6, 7], [2, 1, 0, 3, 9]])
+    # 向きや始点が違っても同じ環には同じキー、フレームをまたいでも変わらない。
+    second = ring_keys([[7, 5, 6], [3, 2, 1, 0]])
+    assert set(second) < set(first)
+    assert len(first) == 3
+    # 新しい環には、これまでのどれとも違うキーがつく。
+    third = ring_keys([[0, 1, 2, 4], [1, 2, 3, 0]])
+    assert len(set(third) - set(first)) == 1
+    assert len(ring_keys([])) == 0
@@ -0,0 +1,61 @@
+"""MotifIndexの登録・検索と、索引の鮮度の確認"""
+
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from xi.common.graph2 import Graph3D, MotifIndex
+
+
+def ring(n):
+    """n員環のGraph3D"""
+    angles = np.arange(n) * 2 * np.pi / n
+    position = {
+        str(i): np.array([np.cos(a), np.sin(a), 0.0]) for i, a in enumerate(angles)
+    }
+    return Graph3D(graph=nx.cycle_graph([str(i) for i in range(n)]), position=position)
+
+
+def test_open_does_not_write(tmp_path):
+    directory = tmp_path / "ref"
+    index = MotifIndex(str(directory))
+    assert index.lookup(ring(6).graph) is None
+    assert not directory.exists()
+
+
+def test_add_and_lookup(tmp_path):
+    directory = str(tmp_path / "ref")
+    index = MotifIndex(directory)
+    assert index.add(ring(6), 6) == "6"
+    # 同型なグラフは既存のidを返す。
+    assert index.add(ring(6), 60) == "6"
+    assert MotifIndex(directory).lookup(ring(6).graph) == "6"
+    assert MotifIndex(directory).lookup(ring(5).graph) is None
+
+
+def test_add_rejects_used_id(tmp_path):
+    directory = str(tmp_path / "ref")
+    index = MotifIndex(directory)
+    index.add(ring(6), 6)
+    with pytest.raises(ValueError):
+        index.add(ring(5), 6)
+    assert MotifIndex(directory).lookup(ring(6).graph) == "6"
+
+
+def test_stale_index(tmp_path):
+    directory = str(tmp_path / "ref")
+    MotifIndex(directory).add(ring(6), 6)
+    filename = os.path.join(directory, "index.json")
+    with open(filename) as f:
+        stored = f.read()
+    # 参照グラフをその場で書きかえると、開くときにメモリ上で作りなおす。
+    ring(5).dump(6, directory)
+    index = MotifIndex(directory)
+    assert index.lookup(ring(5).graph) == "6"
+    assert index.lookup(ring(6).graph) is None
+    with open(filename) as f:
+        assert f.read() == stored
+    assert "files" in json.loads(stored)
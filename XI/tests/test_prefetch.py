@@ -0,0 +1,88 @@
+"""prefetchが、フレームの源によらず、そのまま読んだ場合と同じフレームを返すことの確認"""
+
+import io
+from functools import partial
+
+import numpy as np
+import pytest
+
+from xi.common import prefetch as prefetch_module
+from xi.common.compressed import GroTrajectory
+from xi.common.gromacs2 import read_gro
+from xi.common.instrument import Profiler
+from xi.common.prefetch import prefetch
+from xi.common.synth import ice_frame
+
+
+@pytest.fixture(autouse=True)
+def cpus(monkeypatch):
+    # CPUが一つの環境でも先読みの経路を通す。
+    monkeypatch.setattr(prefetch_module, "_cpu_count", lambda: 2)
+
+
+@pytest.fixture(scope="module")
+def gro_file(tmp_path_factory):
+    """小さな氷を3フレームならべた.gro"""
+    filename = tmp_path_factory.mktemp("prefetch") / "ice.gro"
+    with open(filename, "w") as f:
+        for seed in range(3):
+            ice_frame("Ic", 100, disorder=True, seed=seed).write_gro(f)
+    return str(filename)
+
+
+def check(frames, gro_file):
+    with open(gro_file) as f:
+        expected = list(read_gro(f))
+    n_frames = 0
+    for frame, reference in zip(frames, expected):
+        # 共有メモリのビューは次のフレームで上書きされうるので、ここで比べる。
+        np.testing.assert_array_equal(frame.position, reference.position)
+        n_frames += 1
+    assert n_frames == len(expected)
+
+
+def test_filename(gro_file):
+    check(prefetch(gro_file), gro_file)
+
+
+def test_trajectory(gro_file):
+    check(prefetch(GroTrajectory(gro_file)), gro_file)
+
+
+def test_callable(gro_file):
+    check(prefetch(partial(GroTrajectory, gro_file)), gro_file)
+
+
+def test_unpicklable(gro_file):
+    # ジェネレータはpickleできないので、スレッドで先読みする。
+    with open(gro_file) as f:
+        text = f.read()
+    check(prefetch(read_gro(io.StringIO(text))), gro_file)
+
+
+def test_error(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(prefetch(str(tmp_path / "missing.gro")))
+
+
+@pytest.mark.parametrize("source", ["file", "generator"])
+def test_profile(gro_file, source, monkeypatch):
+    profiler = Profiler()
+    profiler.enable()
+    monkeypatch.setattr(prefetch_module, "profiler", profiler)
+    if source == "file":
+        frames = prefetch(gro_file)
+    else:
+        # スレッドで先読みする場合
+        frames = prefetch(GroTrajectory(gro_file).__iter__())
+    for frame in profiler.frames(frames):
+        pass
+    report = profiler.report()
+    assert len(report["frames"]) == 3
+    for record in report["frames"]:
+        # 読みこみ側で測った構文解析の時間
+        assert record["time"]["parse"] > 0
+        if source == "file":
+            assert record["reader_peak_memory"] > 0
+    if source == "file":
+        assert report["total"]["peak_memory"] > report["total"]["reader_peak_memory"]
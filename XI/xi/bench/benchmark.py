@@ -0,0 +1,335 @@
+"""性能測定。
+
+人工的な氷・水の配置(xi.common.synth)を大きさを変えて作り、各処理の所要時間と
+最大メモリを測る。結果をbaselineとして保存しておけば、あとで比較して性能の
+劣化を検出できる。XIのディレクトリで実行する。
+
+    python -m xi.bench.benchmark --sizes 1000,10000 --save baseline.json
+    python -m xi.bench.benchmark --sizes 1000,10000 --baseline baseline.json
+"""
+
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from logging import getLogger, INFO
+import logging
+
+import click
+import numpy as np
+import networkx as nx
+from cycless import cycles
+
+from xi.common.gromacs2 import read_gro
+from xi.common.compressed import open_trajectory, compress_bgzf, GroTrajectory
+from xi.common.graph2 import gro2atoms, hb_edges
+from xi.common import kernels
+from xi.common.energy import energies_tip4pice
+from xi.common.synth import ice_frame, LATTICES
+from xi.common.undump import undump_edr, units
+
+# XIのディレクトリ。スクリプトはここで実行する。
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _measure(function, memory=True, repeat=1):
+    """functionの所要時間(秒)と、memoryなら最大メモリ(バイト)を測る。
+
+    時間はrepeat回のうち最短のもの。メモリの計測は遅いので、時間とは別に実行する。
+    """
+    elapsed = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return dict(time=elapsed, memory=peak)
+
+
+# 子プロセスで"-m"のモジュールを実行し、終了時に自分の最大常駐メモリ(VmHWM)を
+# 環境変数XI_BENCH_PEAKのファイルに書きだす。
+_CHILD = """
+import atexit, os, runpy, sys
+
+def report():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                with open(os.environ["XI_BENCH_PEAK"], "w") as f:
+                    f.write(str(int(line.split()[1]) * 1024))
+
+if os.path.exists("/proc/self/status"):
+    atexit.register(report)
+del sys.argv[0]
+runpy.run_module(sys.argv[0], run_name="__main__", alter_sys=True)
+"""
+
+
+def _measure_process(args, stdin=None):
+    """別プロセスの所要時間と最大常駐メモリ(バイト)を測る。
+
+    argsは["-m", モジュール, 引数...]。Linuxでは、子プロセスが終了時に読んだ自分の
+    VmHWMを使う。wait4のru_maxrssには、forkした時点の親の常駐メモリがふくまれて
+    しまうため。/procがなければru_maxrssを使う。
+    """
+    assert args[0] == "-m"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report = os.path.join(tmpdir, "peak")
+        env = dict(os.environ, XI_BENCH_PEAK=report)
+        start = time.perf_counter()
+        with open(stdin or os.devnull) as f:
+            process = subprocess.Popen(
+                [sys.executable, "-c", _CHILD] + args[1:],
+                cwd=ROOT,
+                stdin=f,
+                stdout=subprocess.DEVNULL,
+                env=env,
+            )
+            _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        # Popenに終了を知らせておく。
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            raise RuntimeError(f"{args} failed with status {process.returncode}")
+        if os.path.exists(report):
+            with open(report) as f:
+                peak = int(f.read())
+        else:
+            peak = (
+                usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+            )
+    return dict(time=elapsed, memory=peak)
+
+
+def edr_dump(n_frames, seed=0) -> str:
+    """gmx dump -eの出力に似た文字列を作る。undump_edrの測定用。"""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for i in range(n_frames):
+        lines.append(f"   {'time:':22s}{i * 0.1:14.6e}   step: {i}")
+        for label in units:
+            if label != "time:":
+                lines.append(f"   {label:22s}{rng.normal():14.6e}")
+    return "\n".join(lines) + "\n"
+
+
+def _same(name, a, b):
+    """JITの版とnumpyの版の結果が一致することを確かめる。"""
+    for x, y in zip(a, b):
+        if not np.allclose(x, y, rtol=1e-8, atol=1e-8):
+            raise AssertionError(f"JIT and NumPy versions of {name} disagree.")
+
+
+def benchmark_kernels(waters, frame, rel_O, edges, measure, energy_limit):
+    """kernelsの各関数を、numpyの版と(Numbaがあれば)JITの版で測り、結果を比べる。
+
+    JITの版は、一度呼んでコンパイルをすませてから測る。
+    """
+    com = (waters[:, 0] * 16 + waters[:, 1] + waters[:, 2]) / 18
+    cases = dict(
+        bond_vectors=lambda jit: (kernels.bond_vectors(rel_O, edges, jit=jit),),
+        midpoint_bins=lambda jit: kernels.bond_midpoint_bins(
+            rel_O, edges, frame.cell, 0.7, jit=jit
+        ),
+    )
+    if len(waters) <= energy_limit:
+        cases["energies"] = lambda jit: (
+            energies_tip4pice(waters, com, frame.cell, jit=jit),
+        )
+    results = dict()
+    backends = (False, True) if kernels.HAVE_NUMBA else (False,)
+    for name, case in cases.items():
+        reference = case(False)
+        for jit in backends:
+            _same(name, reference, case(jit))
+            suffix = "_jit" if jit else "_numpy"
+            results[name + suffix] = measure(lambda: case(jit))
+    return results
+
+
+def benchmark_compressed(filename, frame_text, measure):
+    """ふつうのgzipとBGZFに圧縮したファイルの読みこみを測り、内容と番号での
+    アクセスが圧縮していない場合と同じであることを確かめる。"""
+    results = dict()
+    with open(filename, "rb") as src, gzip.open(filename + ".gz", "wb") as dst:
+        dst.write(src.read())
+    with open(filename, "rb") as src, open(filename + ".bgz", "wb") as dst:
+        compress_bgzf(src, dst)
+
+    def read(name):
+        with open_trajectory(name) as f:
+            return next(read_gro(f))
+
+    reference = next(read_gro(io.StringIO(frame_text)))
+    for name, suffix in (("read_gro_gzip", ".gz"), ("read_gro_bgzf", ".bgz")):
+        frame = read(filename + suffix)
+        if not np.array_equal(frame.position, reference.position):
+            raise AssertionError(f"{name} read a different frame.")
+        with GroTrajectory(filename + suffix) as trajectory:
+            if not np.array_equal(trajectory[-1].position, reference.position):
+                raise AssertionError(f"{name} random access failed.")
+        results[name] = measure(lambda: read(filename + suffix))
+    return results
+
+
+def benchmark_size(
+    n_molecules, lattice, disorder, directory, memory, energy_limit, repeat=1
+):
+    """ひとつの大きさについて、すべての項目を測る。"""
+    logger = getLogger()
+    results = dict()
+
+    def measure(function):
+        return _measure(function, memory, repeat)
+
+    frame = ice_frame(lattice, n_molecules, disorder=disorder)
+    n_molecules = len(frame.position) // 4
+    filename = os.path.join(directory, f"{lattice}-{n_molecules}.gro")
+
+    def write():
+        with open(filename, "w") as f:
+            frame.write_gro(f)
+
+    results["write_gro"] = measure(write)
+    with open(filename) as f:
+        text = f.read()
+    results["read_gro"] = measure(lambda: next(read_gro(io.StringIO(text))))
+    results.update(benchmark_compressed(filename, frame_text=text, measure=measure))
+    frame = next(read_gro(io.StringIO(text)))
+    results["decompose"] = measure(frame.decompose)
+
+    rel_O, rel_H, _ = gro2atoms(frame)
+    waters = frame.position[
+        np.stack([frame.select(atom=name) for name in ("OW", "HW1", "HW2", "MW")], 1)
+    ]
+
+    def network():
+        return nx.DiGraph(hb_edges(rel_O, rel_H, frame.cell).tolist())
+
+    results["hb_network"] = measure(network)
+    G = nx.Graph(network())
+
+    # コンパクト形式(float32)でも同じ水素結合網になることを確かめる。食いちがう
+    # 辺の数を結果に残し、測定は続ける。
+    results["read_gro_compact"] = measure(
+        lambda: next(read_gro(io.StringIO(text), compact=True))
+    )
+    compact = next(read_gro(io.StringIO(text), compact=True))
+    rel_O32, rel_H32, _ = gro2atoms(compact)
+    results["hb_network_compact"] = measure(
+        lambda: hb_edges(rel_O32, rel_H32, compact.cell)
+    )
+    reference = set(map(tuple, hb_edges(rel_O, rel_H, frame.cell).tolist()))
+    edges = set(map(tuple, hb_edges(rel_O32, rel_H32, compact.cell).tolist()))
+    mismatch = len(edges ^ reference)
+    results["hb_network_compact"]["mismatched_edges"] = mismatch
+    if mismatch > 0:
+        logger.warning(
+            f"Compact mode changed {mismatch} hydrogen bonds "
+            f"of {len(reference)} at {n_molecules} molecules."
+        )
+
+    def ring_count():
+        return sum(1 for _ in cycles.cycles_iter(G, maxsize=7, pos=rel_O))
+
+    results["rings"] = measure(ring_count)
+
+    edges = hb_edges(rel_O, rel_H, frame.cell)[:, ::-1]
+    results.update(
+        benchmark_kernels(waters, frame, rel_O, edges, measure, energy_limit)
+    )
+
+    dump = edr_dump(max(1, n_molecules // 100))
+    results["undump_edr"] = measure(lambda: undump_edr(io.StringIO(dump)))
+
+    for script in ("cycle_dipole.py", "grid_dipole.py"):
+        module = "xi." + script.removesuffix(".py")
+        results[script] = _measure_process(["-m", module, filename])
+    # 全分子対の計算なので、大きな系では測らない。
+    if n_molecules <= energy_limit:
+        results["energy"] = _measure_process(["-m", "xi.common.energy"], stdin=filename)
+
+    for name, result in results.items():
+        logger.info(f"{n_molecules:8d} {name:20s} {result['time']:10.3f} s")
+    return n_molecules, results
+
+
+def compare(results, baseline, tolerance):
+    """基準と比べ、時間がtolerance倍をこえた項目の一覧を返す。"""
+    regressions = []
+    for size, cases in results.items():
+        for name, result in cases.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            ratio = result["time"] / reference["time"]
+            mark = "!" if ratio > tolerance else " "
+            print(f"{mark} {size:>8s} {name:20s} {ratio:6.2f}x", file=sys.stderr)
+            if ratio > tolerance:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    default="1000,10000,100000,1000000",
+    help="Comma-separated numbers of molecules.",
+)
+@click.option("--lattice", type=click.Choice(list(LATTICES)), default="Ic")
+@click.option("--disorder", is_flag=True, help="Use disordered (water-like) frames.")
+@click.option("--no-memory", is_flag=True, help="Skip in-process memory tracing.")
+@click.option("--repeat", default=1, help="Repetitions of in-process timings (best).")
+@click.option(
+    "--energy-limit",
+    default=10000,
+    help="Largest system for the O(N^2) energy calculation.",
+)
+@click.option("--save", type=click.Path(), help="Store the results as a baseline.")
+@click.option(
+    "--baseline", type=click.Path(exists=True), help="Compare with a baseline."
+)
+@click.option("--tolerance", default=1.2, help="Allowed slowdown against the baseline.")
+def main(
+    sizes, lattice, disorder, no_memory, repeat, energy_limit, save, baseline, tolerance
+):
+    """Time and measure the memory of the analysis stages on synthetic frames."""
+    logging.basicConfig(level=INFO)
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes.split(","):
+            n, cases = benchmark_size(
+                int(size),
+                lattice,
+                disorder,
+                directory,
+                not no_memory,
+                energy_limit,
+                repeat,
+            )
+            # 実際の分子数ではなく、指定した大きさで記録する。
+            results[size] = cases
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    if save:
+        with open(save, "w") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""圧縮したトラジェクトリーの読みこみ。
+
+.groやgmx dumpの出力を、展開したファイルを作らずに直接読む。形式は拡張子で
+判断する。
+
+- .gz, .bgz, .bgzf: gzip。BGZF(ブロックごとに圧縮したgzip、bgzipで作れる)なら、
+  ブロックをスレッドで並列に展開し、任意の位置に速くseekできる。
+- .zst, .zstd: zstd(zstandardが必要)。内容の大きさを記録したフレームが複数ある
+  (pzstdなどで作った)なら、フレームをスレッドで並列に展開し、seekできる。
+- それ以外: 圧縮していないファイル。"-"は標準入力。
+
+ふつうのgzipや単一フレームのzstdは、頭から順に展開しながら読む。
+
+使い方:
+
+    with open_trajectory("traj.gro.gz") as f:
+        for frame in read_gro(f):
+            ...
+
+    trajectory = GroTrajectory("traj.gro.gz")
+    frame = trajectory[100]
+"""
+
+import bisect
+import gzip
+import io
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+import numpy as np
+
+from xi.common.gromacs2 import Frame, read_gro, read_gro_frame, index_gro
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_SUFFIXES = (".gz", ".bgz", ".bgzf")
+ZSTD_SUFFIXES = (".zst", ".zstd")
+
+# BGZFのブロックに入れる最大の大きさ(bgzipと同じ)
+_BGZF_BLOCK = 0xFF00
+# BGZFの終わりを示す空のブロック
+_BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+_ZSTD_MAGIC = 0xFD2FB528
+# これより大きなフレームは、並列に展開せず順に展開する。
+_ZSTD_MAX_FRAME = 1 << 26
+
+
+def _bgzf_blocks(file):
+    """BGZFファイルのブロックの表。BGZFでなければNone。
+
+    ブロックの見出しと末尾だけを読むので、展開はしない。
+
+    Returns:
+        np.ndarray: ブロックごとの(圧縮したブロックの位置, その大きさ, 展開した大きさ)
+    """
+    blocks = []
+    offset = 0
+    while True:
+        file.seek(offset)
+        header = file.read(12)
+        if len(header) == 0:
+            break
+        if len(header) < 12 or header[:4] != b"\x1f\x8b\x08\x04":
+            return None
+        xlen = struct.unpack("<H", header[10:12])[0]
+        extra = file.read(xlen)
+        # 追加フィールドからBC(ブロックの大きさ)をさがす。
+        size = None
+        p = 0
+        while p + 4 <= len(extra):
+            si, slen = extra[p : p + 2], struct.unpack("<H", extra[p + 2 : p + 4])[0]
+            if si == b"BC" and slen == 2:
+                size = struct.unpack("<H", extra[p + 4 : p + 6])[0] + 1
+            p += 4 + slen
+        if size is None:
+            return None
+        file.seek(offset + size - 4)
+        isize = struct.unpack("<I", file.read(4))[0]
+        if isize > 0:
+            blocks.append((offset, size, isize))
+        offset += size
+    return np.array(blocks, dtype=np.int64).reshape(-1, 3)
+
+
+def _zstd_frames(file):
+    """内容の大きさを記録したzstdフレームの表。順に展開すべきならNone。
+
+    フレームとブロックの見出しだけを読むので、展開はしない。
+
+    Returns:
+        np.ndarray: フレームごとの(圧縮したフレームの位置, その大きさ, 展開した大きさ)
+    """
+    frames = []
+    offset = 0
+    while True:
+        file.seek(offset)
+        header = file.read(4)
+        if len(header) == 0:
+            break
+        if len(header) < 4:
+            return None
+        magic = struct.unpack("<I", header)[0]
+        if magic & 0xFFFFFFF0 == 0x184D2A50:
+            # スキップできるフレーム(pzstdはここにフレームの大きさを書く)
+            offset += 8 + struct.unpack("<I", file.read(4))[0]
+            continue
+        if magic != _ZSTD_MAGIC:
+            return None
+        descriptor = file.read(1)[0]
+        fcs_flag = descriptor >> 6
+        single_segment = (descriptor >> 5) & 1
+        checksum = (descriptor >> 2) & 1
+        dict_size = (0, 1, 2, 4)[descriptor & 3]
+        fcs_size = (single_segment, 2, 4, 8)[fcs_flag]
+        if fcs_size == 0:
+            # 展開した大きさがわからない。
+            return None
+        file.read((1 - single_segment) + dict_size)
+        fcs = int.from_bytes(file.read(fcs_size), "little")
+        if fcs_size == 2:
+            fcs += 256
+        if fcs > _ZSTD_MAX_FRAME:
+            return None
+        # ブロックの見出しをたどって、フレームの終わりを求める。
+        position = file.tell()
+        while True:
+            block = int.from_bytes(file.read(3), "little")
+            last, kind, size = block & 1, (block >> 1) & 3, block >> 3
+            # RLEブロックは1バイト
+            position += 3 + (1 if kind == 1 else size)
+            file.seek(position)
+            if last:
+                break
+        position += 4 * checksum
+        if fcs > 0:
+            frames.append((offset, position - offset, fcs))
+        offset = position
+    if len(frames) < 2:
+        return None
+    return np.array(frames, dtype=np.int64).reshape(-1, 3)
+
+
+def _inflate_bgzf(data):
+    return zlib.decompress(data, wbits=31)
+
+
+def _inflate_zstd(data):
+    # 展開器はスレッド間で共有できないので、その都度作る。
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class BlockReader(io.RawIOBase):
+    """独立に展開できるブロックの列を、スレッドで並列に展開しながら読む。
+
+    展開した内容の上で自由にseekできる。順に読むときは、先のブロックを
+    あらかじめ展開しておく。zlibもzstdも展開中はGILを手放すので、
+    スレッドで並列に動く。
+    """
+
+    def __init__(self, file, blocks, inflate, threads=None):
+        """
+        Args:
+            file (_type_): 圧縮したファイル(バイナリモード、seekできること)
+            blocks (np.ndarray): _bgzf_blocks()などが返すブロックの表
+            inflate (_type_): ブロックを展開する関数
+            threads (int, optional): 展開するスレッドの数. Defaults to None (CPUの数).
+        """
+        super().__init__()
+        self.file = file
+        self.blocks = blocks
+        self.inflate = inflate
+        # 展開した内容での、各ブロックの先頭の位置
+        self.starts = np.concatenate([[0], np.cumsum(blocks[:, 2])]).tolist()
+        threads = threads or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(threads)
+        # 先に展開しておくブロックの数
+        self.depth = 2 * threads
+        self.pending = deque()
+        self.current = -1
+        self.data = b""
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.starts[-1]
+        if offset < 0:
+            raise ValueError("Negative seek position.")
+        self.position = offset
+        return self.position
+
+    def _submit(self, k):
+        offset, size, _ = self.blocks[k]
+        self.file.seek(offset)
+        self.pending.append(
+            (k, self.executor.submit(self.inflate, self.file.read(size)))
+        )
+
+    def _load(self, k):
+        """k番目のブロックを展開したものを、いまのブロックにする。"""
+        # 順に読んでいなければ、先読みを捨てる。
+        if not self.pending or self.pending[0][0] != k:
+            for _, future in self.pending:
+                future.cancel()
+            self.pending.clear()
+            self._submit(k)
+        last = self.pending[-1][0]
+        for j in range(last + 1, min(k + self.depth, len(self.blocks))):
+            self._submit(j)
+        _, future = self.pending.popleft()
+        self.current = k
+        self.data = future.result()
+
+    def readinto(self, buffer):
+        if self.position >= self.starts[-1]:
+            return 0
+        k = bisect.bisect_right(self.starts, self.position) - 1
+        if k != self.current:
+            self._load(k)
+        start = self.position - self.starts[k]
+        n = min(len(buffer), len(self.data) - start)
+        buffer[:n] = self.data[start : start + n]
+        self.position += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            for _, future in self.pending:
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            self.file.close()
+        super().close()
+
+
+def _open_zstd(filename, threads=None):
+    if zstandard is None:
+        raise ImportError(f"Reading {filename} requires the zstandard package.")
+    file = open(filename, "rb")
+    frames = _zstd_frames(file)
+    if frames is not None:
+        return BlockReader(file, frames, _inflate_zstd, threads)
+    file.seek(0)
+    return zstandard.ZstdDecompressor().stream_reader(file, closefd=True)
+
+
+def open_trajectory(filename, mode="rt", threads=None):
+    """圧縮したファイルも、拡張子から判断して透過的に開く。
+
+    Args:
+        filename (str): ファイル名。"-"なら標準入力。
+        mode (str, optional): "rt"(テキスト)か"rb"(バイナリ). Defaults to "rt".
+        threads (int, optional): ブロックを展開するスレッドの数. Defaults to None (CPUの数).
+
+    Returns:
+        ファイルオブジェクト。BGZFとフレームの複数あるzstdは、展開した内容の上でseekできる。
+    """
+    if mode not in ("rt", "rb", "r"):
+        raise ValueError(f"Unsupported mode {mode}.")
+    if filename == "-":
+        return sys.stdin.buffer if mode == "rb" else sys.stdin
+    name = os.fspath(filename)
+    if name.endswith(GZIP_SUFFIXES):
+        file = open(name, "rb")
+        blocks = _bgzf_blocks(file)
+        if blocks is None:
+            file.close()
+            raw = gzip.open(name, "rb")
+        else:
+            getLogger().debug(f"{name}: {len(blocks)} BGZF blocks.")
+            raw = io.BufferedReader(BlockReader(file, blocks, _inflate_bgzf, threads))
+    elif name.endswith(ZSTD_SUFFIXES):
+        raw = io.BufferedReader(_open_zstd(name, threads))
+    else:
+        raw = open(name, "rb")
+    if mode == "rb":
+        return raw
+    return io.TextIOWrapper(raw)
+
+
+def compress_bgzf(src, dst, level=6):
+    """ファイルをBGZF形式で圧縮する。bgzipと同じ形式になる。
+
+    BGZFは、ふつうのgzipとして読めるうえに、open_trajectoryで並列に展開し、
+    任意のフレームに速くseekできる。
+
+    Args:
+        src (_type_): 圧縮する内容(バイナリモード)
+        dst (_type_): 書きだす先(バイナリモード)
+        level (int, optional): 圧縮の度合い. Defaults to 6.
+    """
+    while True:
+        data = src.read(_BGZF_BLOCK)
+        if len(data) == 0:
+            break
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        deflated = compressor.compress(data) + compressor.flush()
+        header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+        dst.write(header + struct.pack("<H", len(deflated) + 25))
+        dst.write(deflated)
+        dst.write(struct.pack("<II", zlib.crc32(data), len(data)))
+    dst.write(_BGZF_EOF)
+
+
+class GroTrajectory:
+    """(圧縮されているかもしれない).groファイルのフレームに、番号で直接アクセスする。
+
+    はじめてフレームの数や位置が必要になったときに、ファイルを一度読んで
+    各フレームの先頭の位置を調べる(index_gro)。BGZFとフレームの複数あるzstdでは、
+    その後のアクセスは必要なブロックしか展開しない。ふつうのgzipなどでは、
+    前にもどるたびに頭から展開しなおすことになる。
+
+    トポロジーが変わらないかぎり、どのフレームも名前の配列と原子選択の
+    キャッシュを共有する。
+    """
+
+    def __init__(self, filename, compact=False, threads=None, offsets=None):
+        """
+        Args:
+            filename (str): ファイル名
+            compact (bool, optional): コンパクト形式で読む. Defaults to False.
+            threads (int, optional): ブロックを展開するスレッドの数. Defaults to None.
+            offsets (np.ndarray, optional): index_groの結果。保存しておいたものを
+                渡せば、調べなおさない. Defaults to None.
+        """
+        self.filename = filename
+        self.compact = compact
+        self.threads = threads
+        self._offsets = offsets
+        self._file = None
+        self._position = 0
+        self._last = None
+        self._table = dict()
+
+    def __iter__(self):
+        with open_trajectory(self.filename, threads=self.threads) as file:
+            yield from read_gro(file, compact=self.compact)
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """各フレームの先頭の位置(展開した内容での)と、最後に全体の大きさ"""
+        if self._offsets is None:
+            self._offsets = index_gro(self._binary())
+            self._position = self._offsets[-1]
+        return self._offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _binary(self):
+        if self._file is None:
+            self._file = open_trajectory(self.filename, "rb", self.threads)
+            self._position = 0
+        return self._file
+
+    def _seek(self, offset):
+        file = self._binary()
+        if file.seekable():
+            file.seek(offset)
+            return
+        # seekできない展開器は、前にもどるときは開きなおし、読みとばして進む。
+        if offset < self._position:
+            self.close()
+            file = self._binary()
+        while self._position < offset:
+            skipped = len(file.read(min(offset - self._position, 1 << 20)))
+            if skipped == 0:
+                break
+            self._position += skipped
+
+    def __getitem__(self, i) -> Frame:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Frame {i} is out of range.")
+        start, end = self.offsets[i], self.offsets[i + 1]
+        self._seek(start)
+        text = io.StringIO(self._binary().read(end - start).decode())
+        self._position = end
+        frame = read_gro_frame(text, self.compact, self._last, self._table)
+        self._last = frame
+        return frame
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,156 @@
+import click
+
+from xi.common.prefetch import prefetch
+from xi.common.instrument import profiler
+from xi.common import kernels
+import numpy as np
+
+kB = 1.380649e-23  # Boltzmann constant
+NA = 6.02214076e23  # Avogadro constant
+q = 1.602176634e-19  # Unit charge
+CC = 8.987552e9  # Coulomb constant
+
+# http://www.sklogwiki.org/SklogWiki/index.php/TIP4P/Ice_model_of_water
+qH = 0.5897 * q
+qM = -qH * 2
+eps_oo = 106.1 * kB * NA  # J/mol
+sig_oo = 0.31668  # nm
+econst = NA * CC / 1e-9
+# 重心間距離がこれより遠い対は相互作用しない。
+cutoff = 0.9  # nm
+
+
+def interactions_tip4pice(
+    atom_pos: np.ndarray, target: int, com: np.ndarray, cell: np.ndarray
+) -> np.ndarray:
+    """TIP4P/Iceモデルの1分子と残りすべてとの相互作用
+
+    Args:
+        atom_pos (np.ndarray): 三次元配列 (分子番号 x 原子 x 空間次元)
+        target (int): 注目する分子の番号
+        com (np.ndarray): 重心位置(分子番号x空間次元)
+        cell (np.ndarray): セル行列(空間次元x空間次元)
+
+    Returns:
+        np.ndarray: 相互作用エネルギー J/mol 自分自身との相互作用は0とする。
+    """
+    celli = np.linalg.inv(cell)
+    Nmol = atom_pos.shape[0]
+
+    relpos = com - com[target]
+    # 相互作用相手の分子のセル
+    cell_offset = np.floor(relpos @ celli + 0.5) @ cell
+
+    # 重心の相対位置を、PBCに従い調整
+    relpos -= cell_offset
+
+    # 重心間距離が0.9 nmより近いならTrue
+    prox = np.sum(relpos * relpos, axis=1) < cutoff**2
+    # 自分自身は数えない
+    profiler.count("pairs", np.count_nonzero(prox) - 1)
+
+    # 原子対ごとに距離を求め、エネルギーを計算する
+    interactions = np.zeros(Nmol)
+
+    mm = atom_pos[:, 3] - atom_pos[target, 3] - cell_offset
+    interactions += econst * qM * qM / np.linalg.norm(mm, axis=1)
+
+    for j in (1, 2):
+        for k in (1, 2):
+            hh = atom_pos[:, j] - atom_pos[target, k] - cell_offset
+            interactions += econst * qH * qH / np.linalg.norm(hh, axis=1)
+
+    for j in (1, 2):
+        mh = atom_pos[:, j] - atom_pos[target, 3] - cell_offset
+        interactions += econst * qH * qM / np.linalg.norm(mh, axis=1)
+        mh = atom_pos[:, 3] - atom_pos[target, j] - cell_offset
+        interactions += econst * qH * qM / np.linalg.norm(mh, axis=1)
+
+    oo = atom_pos[:, 0] - atom_pos[target, 0] - cell_offset
+    # 酸素酸素間距離の配列
+    r_oo = np.linalg.norm(oo, axis=1)
+    interactions += 4 * eps_oo * ((sig_oo / r_oo) ** 12 - (sig_oo / r_oo) ** 6)
+
+    # proxをかけることで、0.9 nmよりも重心間距離が遠い対は相互作用しない。
+    interactions *= prox
+
+    # 自分自身との相互作用は除外する
+    interactions[target] = 0
+
+    # 相互作用を返す。
+    return interactions
+
+
+def energies_tip4pice(
+    atom_pos: np.ndarray, com: np.ndarray, cell: np.ndarray, jit=None
+) -> np.ndarray:
+    """TIP4P/Iceモデルで、各分子と残りすべてとの相互作用の合計
+
+    JITが使えるなら、全分子対をコンパイルした一つのループで並列に計算する。
+    そうでなければ、interactions_tip4piceを分子ごとに呼ぶ。
+
+    Args:
+        atom_pos (np.ndarray): 三次元配列 (分子番号 x 原子 x 空間次元)
+        com (np.ndarray): 重心位置(分子番号x空間次元)
+        cell (np.ndarray): セル行列(空間次元x空間次元)
+        jit (bool, optional): コンパイルした版を使うかどうか. Defaults to None.
+
+    Returns:
+        np.ndarray: 分子ごとの相互作用エネルギー J/mol
+    """
+    if kernels.use_jit(jit):
+        energies, pairs = kernels.site_energies(
+            atom_pos, com, cell, [0, qH, qH, qM], eps_oo, sig_oo, econst, cutoff
+        )
+        profiler.count("pairs", pairs.sum())
+        return energies
+    return np.array(
+        [
+            np.sum(interactions_tip4pice(atom_pos, i, com, cell))
+            for i in range(atom_pos.shape[0])
+        ]
+    )
+
+
+@click.command()
+@click.argument("gro_file", type=click.Path(exists=True, allow_dash=True), default="-")
+def main(gro_file):
+    """Print the TIP4P/Ice interaction energy (kJ/mol) of each water molecule."""
+    for frame in profiler.frames(prefetch(gro_file)):
+        profiler.count("atoms", len(frame.position))
+        # 水分子の原子をOW, HW1, HW2, MWの順に選ぶ。残基名(water, SOL, ICEなど)にはよらない。
+        # 原子の選択はトポロジーごとにキャッシュされる。
+        with profiler.stage("select"):
+            sites = np.stack(
+                [frame.select(atom=name) for name in ("OW", "HW1", "HW2", "MW")],
+                axis=1,
+            )
+            positions = frame.position[sites]
+
+        # 水分子がPBCでばらけているやつがいるらしい。
+        # 酸素との相対位置になおし、修正する。
+        celli = np.linalg.inv(frame.cell)
+        for i in (1, 2, 3):
+            positions[:, i] -= positions[:, 0]
+        positions[:, 1:4] -= np.floor(positions[:, 1:4] @ celli + 0.5) @ frame.cell
+        for i in (1, 2, 3):
+            positions[:, i] += positions[:, 0]
+
+        # 念のため、OHが離れすぎている場合は打ち切る
+        assert np.all(np.sum((positions[:, 0] - positions[:, 1]) ** 2, axis=1) < 0.01)
+        assert np.all(np.sum((positions[:, 0] - positions[:, 2]) ** 2, axis=1) < 0.01)
+
+        # まず、周期境界条件のために、分子の重心Center of Massを計算しておく
+        com = (positions[:, 0] * 16 + positions[:, 1] + positions[:, 2]) / 18
+
+        with profiler.stage("interactions_tip4pice"):
+            energies = energies_tip4pice(positions, com, frame.cell)
+        with profiler.stage("output"):
+            for (x, y, z), energy in zip(com, energies):
+                print(f"{x:.4f} {y:.4f} {z:.4f} {energy/1000:.4f}")
+        # 空行で仕切る
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,585 @@
+from __future__ import annotations
+
+import numpy as np
+import pairlist as pl
+from logging import getLogger
+import json
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from xi.common.instrument import profiler
+
+# networkxの読みこみは遅いので、hb_edgesしか使わないスクリプトのために、
+# 必要な関数の中で読みこむ。
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+def _exact(position):
+    """.groの座標(小数点以下3桁)を、通常の形式と同じfloat64の値にもどす。
+
+    コンパクト形式のfloat32は小数点以下3桁を正確には表せないので、そのまま
+    セル相対座標にすると、ちょうどrcの距離にある対の判定が通常の形式と食いちがう。
+    """
+    if position.dtype == np.float64:
+        return position
+    return np.round(position.astype(np.float64), 3)
+
+
+# for gromacs2.py's Frame object
+
+
+# copied from ../Solution/cycles.py
+def gro2atoms(frame, O="OW", H="HW"):
+    """groファイルから水の原子位置を割り出して相対座標を返す
+
+    水素は分子ごとに(HW1, HW2の順に)ならぶので、水素jは分子j//2に属する。
+
+    Args:
+        frame (_type_): _description_
+        O (str, optional): 酸素の原子名の先頭. Defaults to "OW".
+        H (str, optional): 水素の原子名の先頭. Defaults to "HW".
+
+    Returns:
+        tuple: 酸素と水素のセル相対座標と、セル行列
+    """
+    cell = frame.cell
+    celli = np.linalg.inv(cell)
+    oxygens = _exact(frame.position[frame.select(atom_prefix=O)])
+    hydrogens = _exact(frame.position[frame.select(atom_prefix=H)])
+
+    # in a fractional coordinate
+    o_frac = oxygens @ celli
+    h_frac = hydrogens @ celli
+    return o_frac, h_frac, cell
+
+
+def OH2graph(o_frac, h_frac, cell):
+    """酸素と水素の位置から水素結合ネットワークを割りだす。
+
+    Args:
+        o_frac (_type_): _description_
+        h_frac (_type_): _description_
+        cell (_type_): _description_
+
+    Returns:
+        _type_: _description_
+    """
+    import networkx as nx
+
+    HBs = dict()
+    # 酸素と水素の距離が0.25 nm以下の組みあわせをさがし、
+    for i, j, d in pl.pairs_iter(o_frac, 0.25, cell, pos2=h_frac):
+        # 同じ分子内の酸素と水素でなければ、
+        if d > 0.1:
+            # 水素の番号を分子の番号に換算
+            jo = j // 2
+            # すでに水素結合がある場合は
+            if (jo, i) in HBs:
+                # 新しいほうが長ければ
+                if HBs[jo, i] < d:
+                    # 見送る
+                    continue
+            # 水素結合を登録
+            # 分岐水素結合もできるかもしれないが気にしない。
+            HBs[jo, i] = d
+    return nx.Graph(HBs.keys())
+
+
+# 領域ごとの作業領域の、その領域の酸素1つあたりの大きさ(バイト)。水素と、
+# pairlistの候補対も含む。
+_BYTES_PER_OXYGEN = 4096
+# pairlistが領域ごとにつくる格子の、1マスあたりの大きさ(バイト)
+_BYTES_PER_GRID_CELL = 256
+# 分割するときに、領域の数によらず常に必要な、原子1つあたりの大きさ(バイト)。
+# 原子を箱の順にならべた番号(int32)。
+_BYTES_PER_ATOM = 4
+# 原子を箱に分けるときに一度に扱う原子の数。一時的な配列をこの大きさにおさえる。
+_BLOCK = 1 << 12
+
+
+def _subcell(cell, divisions, halo):
+    """箱とそのハローを囲む小さなセル
+
+    分割した軸では、箱の両側のハローのさらに外に、ハロー2つ分のすきまをあける。
+    小さなセルの周期境界の向こうにある像は、rcの2倍以上離れるので対にならない。
+    分割しない軸は、もとのセルの周期のまま。
+
+    Returns:
+        tuple: 各軸の幅(もとのセル相対)と、小さなセルのセル行列
+    """
+    span = np.where(divisions > 1, 1 / divisions + 4 * halo, 1.0)
+    return span, cell * span[:, None]
+
+
+def _chunk_bytes(cell, rc, divisions, halo, n_oxygen):
+    """divisionsに分けたときの、領域ごとの作業領域の見積もり(バイト)"""
+    _, subcell = _subcell(cell, divisions, halo)
+    grid = np.prod(pl.determine_grid(subcell, rc))
+    return (
+        n_oxygen / np.prod(divisions) * _BYTES_PER_OXYGEN + grid * _BYTES_PER_GRID_CELL
+    )
+
+
+def _divisions(cell, rc, n_oxygen, workspace):
+    """領域ごとの作業領域がworkspaceにおさまるような、各軸の分割数
+
+    いちばん厚い箱の軸から順に分割をふやす。箱がハローにくらべて薄くなりすぎない
+    (厚みが2rc以上)ようにするので、おさまらないこともある。
+    """
+    celli = np.linalg.inv(cell)
+    # 各軸方向のセルの厚み
+    widths = 1 / np.linalg.norm(celli, axis=0)
+    halo = rc / widths
+    limit = np.maximum(widths // (2 * rc), 1)
+    divisions = np.ones(3, dtype=int)
+    while _chunk_bytes(cell, rc, divisions, halo, n_oxygen) > workspace:
+        thickness = np.where(divisions < limit, widths / divisions, 0)
+        if not np.any(thickness > 0):
+            break
+        divisions[np.argmax(thickness)] += 1
+    return divisions
+
+
+def _wrap(frac):
+    """セル相対位置を[0, 1)におさめたコピー(pairlistのためにfloat64)"""
+    frac = frac.astype(np.float64)
+    frac -= np.floor(frac)
+    return frac
+
+
+def _local(frac, origin, span):
+    """originを原点とし、各軸をspanで割った、小さなセルの相対位置(float64)"""
+    frac = frac.astype(np.float64)
+    frac -= origin
+    frac -= np.floor(frac)
+    frac /= span
+    return frac
+
+
+def _box_codes(frac, divisions):
+    """原子ごとの、属する箱の番号(int32)"""
+    box = (_wrap(frac) * divisions).astype(np.int32)
+    np.minimum(box, divisions - 1, out=box)
+    # np.ravel_multi_indexと同じ(C順の)番号づけ
+    return box @ np.array([divisions[1] * divisions[2], divisions[2], 1], np.int32)
+
+
+def _sort_into_boxes(frac, divisions):
+    """原子を属する箱の順にならべた番号(int32)と、箱ごとの区切り
+
+    原子数の長さの配列は返り値の番号だけで、箱の番号はブロックごとに計算しなおす。
+
+    Returns:
+        tuple: 番号の配列と、箱bの原子がorder[bounds[b]:bounds[b+1]]となる区切り
+    """
+    n_box = int(np.prod(divisions))
+    blocks = range(0, len(frac), _BLOCK)
+    counts = np.zeros(n_box, dtype=np.int64)
+    for start in blocks:
+        codes = _box_codes(frac[start : start + _BLOCK], divisions)
+        counts += np.bincount(codes, minlength=n_box)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    # 箱ごとの、次に書きこむ位置
+    filled = bounds[:-1].copy()
+    order = np.empty(len(frac), dtype=np.int32)
+    for start in blocks:
+        codes = _box_codes(frac[start : start + _BLOCK], divisions)
+        local = np.argsort(codes, kind="stable")
+        codes = codes[local]
+        boxes, first, count = np.unique(codes, return_index=True, return_counts=True)
+        # 同じ箱の中での順位
+        rank = np.arange(len(codes)) - np.repeat(first, count)
+        order[filled[codes] + rank] = start + local
+        filled[boxes] += count
+    return order, bounds
+
+
+def hb_edges(
+    o_frac, h_frac, cell, rc=0.25, memory_budget=None, filename=None
+) -> np.ndarray:
+    """酸素と水素の位置から水素結合(供与分子→受容分子)の配列を求める。
+
+    水素jは分子j//2に属するとし、同じ分子内の対は除く。memory_budget(バイト)を
+    指定すると、セルを空間的に分割し、rcのハローをつけた領域ごとに、その領域を
+    囲む小さなセルの中で対を探す。pairlistの格子も領域の大きさになる。
+    分割の数は、原子ごとに常に必要な分(_BYTES_PER_ATOM)を予算からさしひき、
+    残りに領域ごとの作業領域(酸素ごとの_BYTES_PER_OXYGENと、格子のマスごとの
+    _BYTES_PER_GRID_CELL)がおさまるように決める。予算に入るのはこの関数と
+    pairlistが確保する作業領域だけで、引数の配列と返り値の辺(filenameを指定すれば
+    ファイルに書きだす)は含まない。結果の辺の集合は分割しない場合と同じ。
+    位置はfloat32でもよい(コンパクト形式)。
+
+    Args:
+        o_frac (_type_): 酸素のセル相対位置
+        h_frac (_type_): 水素のセル相対位置
+        cell (_type_): セル行列
+        rc (float, optional): 酸素と水素の距離の上限. Defaults to 0.25.
+        memory_budget (int, optional): 作業領域の上限の目安. Defaults to None (分割しない).
+        filename (str, optional): 指定すると、辺をこのファイルに書きだし、
+            np.memmapとして返す. Defaults to None.
+
+    Returns:
+        np.ndarray: 辺の配列 (辺数 x 2, int32)。重複はなく、分割しない場合と同じく
+            供与分子・受容分子の順に整列される(ファイルに書きだした場合は領域ごと)。
+    """
+    logger = getLogger()
+    workspace = np.inf
+    if memory_budget is not None:
+        workspace = memory_budget - _BYTES_PER_ATOM * (len(o_frac) + len(h_frac))
+        if workspace <= 0:
+            raise ValueError(
+                f"memory_budget must exceed {_BYTES_PER_ATOM} bytes per atom."
+            )
+    divisions = _divisions(cell, rc, len(o_frac), workspace)
+    n_box = int(np.prod(divisions))
+    # ハローの厚み(セル相対)
+    halo = rc * np.linalg.norm(np.linalg.inv(cell), axis=0)
+    width = 1 / divisions
+    span, subcell = _subcell(cell, divisions, halo)
+    logger.debug(f"HB detection in {divisions} chunks.")
+    if _chunk_bytes(cell, rc, divisions, halo, len(o_frac)) > workspace:
+        logger.warning(
+            f"Cannot split the cell finely enough; "
+            f"{n_box} chunks may exceed the memory budget."
+        )
+
+    if n_box > 1:
+        o_order, o_bounds = _sort_into_boxes(o_frac, divisions)
+        h_order, h_bounds = _sort_into_boxes(h_frac, divisions)
+    # 箱はハローより厚いので、ハローは隣の箱までにおさまる。
+    shifts = np.array(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1])).reshape(3, -1).T
+
+    chunks = []
+    for b in range(n_box):
+        if n_box == 1:
+            o_idx = np.arange(len(o_frac))
+            h_idx = np.arange(len(h_frac))
+            o_pos = _wrap(o_frac)
+            h_pos = _wrap(h_frac)
+        else:
+            o_idx = o_order[o_bounds[b] : o_bounds[b + 1]]
+            if len(o_idx) == 0:
+                continue
+            index = np.array(np.unravel_index(b, divisions))
+            neighbors = np.unique(
+                np.ravel_multi_index(((index + shifts) % divisions).T, divisions)
+            )
+            h_idx = np.concatenate(
+                [h_order[h_bounds[n] : h_bounds[n + 1]] for n in neighbors]
+            )
+            # 箱の手前のハローの端を原点とする、小さなセルの相対位置
+            origin = index * width - halo
+            h_pos = _local(h_frac[h_idx], origin, span)
+            # 箱とそのハローにある水素
+            inside = np.all(h_pos * span < width + 2 * halo, axis=1)
+            h_idx = h_idx[inside]
+            h_pos = h_pos[inside]
+            o_pos = _local(o_frac[o_idx], origin, span)
+        pairs = pl.pairs_iter(o_pos, rc, subcell, pos2=h_pos, distance=False)
+        pairs = np.asarray(pairs).reshape(-1, 2)
+        profiler.count("pairs", len(pairs))
+        acceptor = o_idx[pairs[:, 0]]
+        donor = h_idx[pairs[:, 1]] // 2
+        edges = np.column_stack([donor, acceptor])[donor != acceptor]
+        edges = np.unique(edges.astype(np.int32), axis=0)
+        if filename is not None:
+            # 書きだしたら手元には残さない。
+            with open(filename, "wb" if len(chunks) == 0 else "ab") as file:
+                edges.tofile(file)
+            chunks.append(len(edges))
+        else:
+            chunks.append(edges)
+    if filename is not None and sum(chunks) > 0:
+        return np.memmap(filename, dtype=np.int32, mode="r").reshape(-1, 2)
+    if filename is not None or len(chunks) == 0:
+        return np.zeros((0, 2), dtype=np.int32)
+    edges = np.concatenate(chunks)
+    if len(chunks) > 1:
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    return edges
+
+
+def center_of_mass(g: nx.Graph, frac, cell):
+    """グラフの重心座標
+
+    Args:
+        g (nx.Graph): 部分グラフ
+        frac (_type_): (部分グラフではなくもとの全グラフの)すべてのノードのセル相対位置
+        cell (_type_): セル行列
+    """
+    # 最初のノードから見た、他のノードの相対位置
+    nodes = list(g.nodes)
+    first = nodes[0]
+    x = frac[nodes] - frac[first]
+    # 相対位置に周期境界条件を施す
+    x -= np.floor(x + 0.5)
+    # 重心
+    com = np.mean(x, axis=0)
+    return com + frac[first]
+
+
+def center_graph(g: nx.Graph, frac, cell):
+    """グラフの重心座標を原点とした、ノードの位置
+
+    Args:
+        g (nx.Graph): 部分グラフ
+        frac (_type_): (部分グラフではなくもとの全グラフの)すべてのノードのセル相対位置
+        cell (_type_): セル行列
+    """
+    # 最初のノードから見た、他のノードの相対位置
+    nodes = list(g.nodes)
+    first = nodes[0]
+    x = frac[nodes] - frac[first]
+    # 相対位置に周期境界条件を施す
+    x -= np.floor(x + 0.5)
+    # 重心
+    com = np.mean(x, axis=0)
+    # 重心を原点とし、絶対座標になおす
+    abso = (x - com) @ cell
+    return {int(node): x for node, x in zip(nodes, abso)}
+
+
+def _batch_relative(offsets, indices, frac):
+    """各断片の最初のノードから見た、ノードの相対位置(周期境界条件つき)"""
+    offsets = np.asarray(offsets)
+    indices = np.asarray(indices)
+    sizes = np.diff(offsets)
+    # 各ノードが属する断片の最初のノード
+    first = np.repeat(indices[offsets[:-1]], sizes)
+    x = frac[indices] - frac[first]
+    x -= np.floor(x + 0.5)
+    return x, sizes, offsets, indices
+
+
+def center_of_mass_batch(offsets, indices, frac, cell):
+    """多数の部分グラフの重心座標をまとめて求める。
+
+    断片kのノードはindices[offsets[k]:offsets[k+1]]。空の断片は許さない。
+
+    Args:
+        offsets (_type_): 断片の区切り (断片数+1)
+        indices (_type_): 全断片のノード番号をつなげたもの
+        frac (_type_): すべてのノードのセル相対位置
+        cell (_type_): セル行列
+
+    Returns:
+        np.ndarray: 断片ごとの重心のセル相対座標 (断片数 x 3)
+    """
+    x, sizes, offsets, indices = _batch_relative(offsets, indices, frac)
+    com = np.add.reduceat(x, offsets[:-1], axis=0) / sizes[:, None]
+    return com + frac[indices[offsets[:-1]]]
+
+
+def center_graph_batch(offsets, indices, frac, cell):
+    """多数の部分グラフについて、重心を原点としたノードの位置をまとめて求める。
+
+    Args:
+        offsets (_type_): 断片の区切り (断片数+1)
+        indices (_type_): 全断片のノード番号をつなげたもの
+        frac (_type_): すべてのノードのセル相対位置
+        cell (_type_): セル行列
+
+    Returns:
+        tuple: 断片ごとの重心のセル相対座標 (断片数 x 3) と、
+            indicesと同じ並びの、重心を原点とした絶対座標 (ノード数 x 3)
+    """
+    x, sizes, offsets, indices = _batch_relative(offsets, indices, frac)
+    com = np.add.reduceat(x, offsets[:-1], axis=0) / sizes[:, None]
+    abso = (x - np.repeat(com, sizes, axis=0)) @ cell
+    return com + frac[indices[offsets[:-1]]], abso
+
+
+def serialize(g: nx.Graph) -> str:
+    """グラフを文字列で表現する
+
+    Args:
+        g (nx.Graph): the undirected graph to be encoded.
+
+    Returns:
+        str: a string representing the graph.
+    """
+
+    return ",".join(f"{x}-{y}" for x, y in g.edges())
+
+
+def deserialize(s):
+    """文字列からグラフに復元
+
+    Args:
+        s (_type_): _description_
+
+    Returns:
+        _type_: _description_
+    """
+    import networkx as nx
+
+    edges = [e.split("-") for e in s.split(",")]
+    return nx.Graph(edges)
+
+
+@dataclass
+class Graph3D:
+    """ノードの絶対座標つきグラフ。
+
+    グラフのノード名は(JSONの仕様にあわせ)数字ではなく文字列とする。
+    """
+
+    graph: nx.Graph
+    position: dict
+
+    def load(self, id, directory="ref"):
+        filename = os.path.join(directory, f"{id}.json")
+        with open(filename) as f:
+            data = json.load(f)
+        self.graph = deserialize(data["graph"])
+        self.position = {k: np.array(v) for k, v in data["nodes"].items()}
+
+    def dump(self, id, directory="ref", **kwarg):
+        filename = os.path.join(directory, f"{id}.json")
+        with open(filename, "w") as filehandle:
+            json.dump(
+                dict(
+                    graph=serialize(self.graph),
+                    nodes={k: list(v) for k, v in self.position.items()},
+                ),
+                filehandle,
+                **kwarg,
+            )
+
+
+def fingerprint(g: nx.Graph, iterations: int = 3) -> str:
+    """グラフの同型不変なフィンガープリント
+
+    Weisfeiler-Lehmanハッシュにノード数と辺数を添えたもの。同型なグラフは必ず同じ
+    値になるが、逆は保証されないので、最終判定には同型判定が必要。
+
+    Args:
+        g (nx.Graph): the graph.
+        iterations (int, optional): WLの反復回数. Defaults to 3.
+
+    Returns:
+        str: fingerprint string.
+    """
+    import networkx as nx
+
+    wl = nx.weisfeiler_lehman_graph_hash(g, iterations=iterations)
+    return f"{g.number_of_nodes()}:{g.number_of_edges()}:{wl}"
+
+
+class MotifIndex:
+    """ref/にあるGraph3Dのフィンガープリント索引。
+
+    索引はref/index.jsonに、フィンガープリントからidのリストへの対応として、
+    作ったときのref/*.jsonの更新時刻と大きさとともに保存する。
+    検索時は同じフィンガープリントをもつ候補だけを同型判定する。
+    索引がない、ref/*.jsonが追加・削除・書きかえられた、あるいはnetworkxの
+    バージョンが変わった(WLハッシュはバージョンで変わることがある)ときは、開くときに
+    メモリ上で作りなおす。開いて検索するだけではファイルを書かず、保存はadd()で行う。
+    """
+
+    def __init__(self, directory="ref"):
+        import networkx as nx
+
+        self.directory = directory
+        self.filename = os.path.join(directory, "index.json")
+        self.index = defaultdict(list)
+        # 候補のグラフはいちど読んだらとっておく。
+        self.graphs = dict()
+        stored = dict()
+        if os.path.exists(self.filename):
+            with open(self.filename) as f:
+                stored = json.load(f)
+        if (
+            stored.get("networkx") == nx.__version__
+            and stored.get("files") == self._stamps()
+        ):
+            self.index.update(stored["index"])
+        else:
+            getLogger().info(f"{self.filename} is stale; rebuilding it in memory.")
+            self.rebuild()
+
+    def _stamps(self):
+        """ref/にあるグラフのidから、そのファイルの[更新時刻(ns), 大きさ]への対応"""
+        if not os.path.isdir(self.directory):
+            return dict()
+        stamps = dict()
+        for name in sorted(os.listdir(self.directory)):
+            id, ext = os.path.splitext(name)
+            if ext == ".json" and name != "index.json":
+                stat = os.stat(os.path.join(self.directory, name))
+                stamps[id] = [stat.st_mtime_ns, stat.st_size]
+        return stamps
+
+    def rebuild(self):
+        """ref/*.jsonをすべて読みなおして索引を作りなおす。"""
+        self.index = defaultdict(list)
+        self.graphs = dict()
+        for id in self._stamps():
+            g3d = Graph3D(graph=None, position=None)
+            g3d.load(id, self.directory)
+            self.graphs[id] = g3d.graph
+            self.index[fingerprint(g3d.graph)].append(id)
+
+    def save(self, **kwarg):
+        """索引を、作ったときのnetworkxのバージョンとファイルの一覧とともに保存する。"""
+        import networkx as nx
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.filename, "w") as f:
+            json.dump(
+                dict(networkx=nx.__version__, files=self._stamps(), index=self.index),
+                f,
+                **kwarg,
+            )
+
+    def _graph(self, id):
+        if id not in self.graphs:
+            g3d = Graph3D(graph=None, position=None)
+            g3d.load(id, self.directory)
+            self.graphs[id] = g3d.graph
+        return self.graphs[id]
+
+    def lookup(self, g: nx.Graph):
+        """gと同型な参照グラフのidを返す。なければNone。
+
+        Args:
+            g (nx.Graph): 部分グラフ
+
+        Returns:
+            str | None: id of the isomorphic reference graph.
+        """
+        import networkx as nx
+
+        for id in self.index.get(fingerprint(g), []):
+            if nx.is_isomorphic(g, self._graph(id)):
+                return id
+        return None
+
+    def add(self, g3d: "Graph3D", id, **kwarg):
+        """まだ登録されていなければg3dをref/{id}.jsonに書きだして索引に加える。
+
+        Args:
+            g3d (Graph3D): 登録するグラフ
+            id (_type_): 新しいid
+
+        Returns:
+            str: 既存の同型グラフがあればそのid、なければ新しいid。
+
+        Raises:
+            ValueError: 同型でない別のグラフがすでにidを使っている。
+        """
+        found = self.lookup(g3d.graph)
+        if found is not None:
+            return found
+        if os.path.exists(os.path.join(self.directory, f"{id}.json")):
+            raise ValueError(f"Motif id {id} is already used.")
+        os.makedirs(self.directory, exist_ok=True)
+        g3d.dump(id, self.directory, **kwarg)
+        # JSONに合わせ、ノード名を文字列にしたグラフを覚えておく。
+        self.graphs[str(id)] = deserialize(serialize(g3d.graph))
+        self.index[fingerprint(g3d.graph)].append(str(id))
+        self.save()
+        return str(id)
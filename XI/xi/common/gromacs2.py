@@ -0,0 +1,419 @@
+#!/usr/bin/env python
+
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Tuple, Iterable, Dict, Union
+import numpy as np
+from logging import getLogger
+
+
+@dataclass
+class Residue:
+    positions: Iterable
+    resname: str = ""
+    atoms: Tuple = ""
+
+
+@dataclass
+class Frame:
+    residue_id: Iterable
+    residue_name: Iterable
+    atom_id: Iterable
+    atom_name: Iterable
+    position: Iterable
+    cell: Iterable
+    # コンパクト形式では、residue_nameとatom_nameは名前ではなく、この表の番号になる。
+    name_table: Union[np.ndarray, None] = None
+    # 原子選択のキャッシュ。read_groはトポロジーが同じフレームどうしでこれを共有する。
+    selections: Dict = field(default_factory=dict, repr=False, compare=False)
+
+    def mask(self, residue=None, atom=None, atom_prefix=None) -> np.ndarray:
+        """条件にあう原子をTrueとするbool配列を返す。
+
+        条件を省略した場合は、その条件では絞りこまない。結果はキャッシュされるので、
+        書きかえないこと。
+
+        Args:
+            residue (str, optional): 残基名. Defaults to None.
+            atom (str, optional): 原子名. Defaults to None.
+            atom_prefix (str, optional): 原子名の先頭部分. Defaults to None.
+
+        Returns:
+            np.ndarray: 原子数の長さのbool配列
+        """
+        key = ("mask", residue, atom, atom_prefix)
+        if key not in self.selections:
+            mask = np.ones(len(self.atom_name), dtype=bool)
+            if self.name_table is None:
+                if residue is not None:
+                    mask &= self.residue_name == residue
+                if atom is not None:
+                    mask &= self.atom_name == atom
+                if atom_prefix is not None:
+                    mask &= np.char.startswith(self.atom_name, atom_prefix)
+            else:
+                # 名前の表の上で判定し、番号で引く。
+                if residue is not None:
+                    mask &= (self.name_table == residue)[self.residue_name]
+                if atom is not None:
+                    mask &= (self.name_table == atom)[self.atom_name]
+                if atom_prefix is not None:
+                    mask &= np.char.startswith(self.name_table, atom_prefix)[
+                        self.atom_name
+                    ]
+            self.selections[key] = mask
+        return self.selections[key]
+
+    def select(self, residue=None, atom=None, atom_prefix=None) -> np.ndarray:
+        """条件にあう原子の番号(0から数える)の配列を返す。
+
+        frame.position[frame.select(...)]のように使う。引数はmask()と同じ。
+        """
+        key = ("index", residue, atom, atom_prefix)
+        if key not in self.selections:
+            index = np.flatnonzero(
+                self.mask(residue=residue, atom=atom, atom_prefix=atom_prefix)
+            )
+            if self.name_table is not None:
+                index = index.astype(np.int32)
+            self.selections[key] = index
+        return self.selections[key]
+
+    def _name(self, names, i):
+        """i番目の原子の名前。コンパクト形式なら番号を名前に戻す。"""
+        if self.name_table is None:
+            return names[i]
+        return str(self.name_table[names[i]])
+
+    def write_gro(self, file, remark="Written by write_gro"):
+        """
+        fileにframeを書きだす。
+        """
+        logger = getLogger()
+
+        # 1行目はメッセージ行
+        print(remark, file=file)
+        # 2行目は原子数
+        Natom = len(self.position)
+        print(Natom, file=file)
+        logger.debug(self.residue_id.shape)
+        # 原子もそのまま
+        for i in range(Natom):
+            ri = self.residue_id[i]
+            r = self._name(self.residue_name, i)
+            a = self._name(self.atom_name, i)
+            ai = self.atom_id[i]
+            pos = self.position[i]
+            logger.debug((ri, r, a, ai, pos))
+            print(
+                f"{ri:5d}{r:5s}{a:>5s}{ai:5d}{pos[0]:8.3f}"
+                f"{pos[1]:8.3f}{pos[2]:8.3f}",
+                file=file,
+            )
+        # セルは、直方体とそれ以外で書き方が違う
+        # cellの各行がセルベクトル。
+        cell = self.cell
+        if np.count_nonzero(cell - np.diag(np.diag(cell))) == 0:
+            print(cell[0, 0], cell[1, 1], cell[2, 2], file=file)
+        else:
+            print(
+                cell[0, 0],
+                cell[1, 1],
+                cell[2, 2],
+                cell[0, 1],
+                cell[0, 2],
+                cell[1, 0],
+                cell[1, 2],
+                cell[2, 0],
+                cell[2, 1],
+                file=file,
+            )
+
+    def decompose(self) -> Dict:
+        """read_gro3で読みこんだ原子列を、分子単位に切りわける。"""
+        Natom = self.position.shape[0]
+        molecules = defaultdict(dict)
+        last_residue_id = -1
+        atom_names = []
+        atom_positions = []
+        for i in range(Natom):
+            residue_id = self.residue_id[i]
+            if len(atom_names) > 0 and residue_id != last_residue_id:
+                atom_names = tuple(atom_names)
+                # 既出のresnameの場合は
+                if residue_name in molecules:
+                    assert molecules[residue_name].atoms == atom_names
+                else:
+                    molecules[residue_name] = Residue(atoms=atom_names, positions=[])
+                molecules[residue_name].positions.append(atom_positions)
+                atom_names = []
+                atom_positions = []
+            last_residue_id = residue_id
+            residue_name = self._name(self.residue_name, i)
+            atom_name = self._name(self.atom_name, i)
+            atom_position = self.position[i].copy()
+
+            atom_names.append(atom_name)
+            atom_positions.append(atom_position)
+
+        if len(atom_names) > 0:
+            atom_names = tuple(atom_names)
+            # 既出のresnameの場合は
+            if residue_name in molecules:
+                assert molecules[residue_name].atoms == atom_names
+            else:
+                molecules[residue_name] = Residue(atoms=atom_names, positions=[])
+            molecules[residue_name].positions.append(atom_positions)
+
+        for residue_name, residue in molecules.items():
+            residue.positions = np.array(residue.positions)
+        return molecules
+
+    def append(self, frame, new_cell: Union[np.ndarray, None] = None):
+        if new_cell is None:
+            new_cell = self.cell
+        if self.name_table is not None:
+            # 名前の表をあわせ、frameの番号をこちらの表の番号に付けかえる。
+            table = list(self.name_table)
+            codes = []
+            for name in frame.name_table:
+                if name not in table:
+                    table.append(name)
+                codes.append(table.index(name))
+            codes = np.array(codes, dtype=_code_dtype(len(table)))
+            self.name_table = np.array(table)
+            self.residue_name = self.residue_name.astype(codes.dtype)
+            self.atom_name = self.atom_name.astype(codes.dtype)
+            frame = Frame(
+                residue_id=frame.residue_id,
+                residue_name=codes[frame.residue_name],
+                atom_id=frame.atom_id,
+                atom_name=codes[frame.atom_name],
+                position=frame.position,
+                cell=frame.cell,
+            )
+        self.atom_id = np.concatenate([self.atom_id, frame.atom_id], axis=0)
+        self.position = np.concatenate([self.position, frame.position], axis=0)
+        self.atom_name = np.concatenate([self.atom_name, frame.atom_name], axis=0)
+        self.residue_id = np.concatenate([self.residue_id, frame.residue_id], axis=0)
+        self.residue_name = np.concatenate(
+            [self.residue_name, frame.residue_name], axis=0
+        )
+        self.cell = new_cell
+        # トポロジーが変わったので、ほかのフレームと共有していたキャッシュは手放す。
+        self.selections = dict()
+
+
+def _code_dtype(n):
+    """n種類の名前の番号をおさめる最小の整数型"""
+    if n <= 256:
+        return np.uint8
+    if n <= 65536:
+        return np.uint16
+    return np.int32
+
+
+def _parse_compact(file, n_atom, table):
+    """コンパクト形式で原子の行を読む。リストを経由せず、配列に直接書きこむ。"""
+    residue_id = np.empty(n_atom, dtype=np.int32)
+    atom_id = np.empty(n_atom, dtype=np.int32)
+    position = np.empty((n_atom, 3), dtype=np.float32)
+    # 名前の番号。表は呼びだし側のフレーム間で共有する。
+    residue_code = np.empty(n_atom, dtype=np.int32)
+    atom_code = np.empty(n_atom, dtype=np.int32)
+    for i in range(n_atom):
+        line = file.readline()
+        residue_id[i] = int(line[0:5])
+        residue_code[i] = table.setdefault(line[5:10].strip(), len(table))
+        atom_code[i] = table.setdefault(line[10:15].strip(), len(table))
+        atom_id[i] = int(line[15:20])
+        position[i] = float(line[20:28]), float(line[28:36]), float(line[36:44])
+    dtype = _code_dtype(len(table))
+    return (
+        residue_id,
+        residue_code.astype(dtype),
+        atom_id,
+        atom_code.astype(dtype),
+        position,
+    )
+
+
+def read_gro_frame(file, compact=False, last=None, table=None):
+    """
+    .groファイルから1フレームを読みこむ。
+
+    lastと同じトポロジーなら、名前の配列と原子選択のキャッシュはlastのものを使う。
+
+    Args:
+        file (_type_): .groファイル
+        compact (bool, optional): コンパクト形式で読む. Defaults to False.
+        last (Frame, optional): 直前に読んだフレーム. Defaults to None.
+        table (dict, optional): コンパクト形式の名前の表(名前から番号へ)。
+            呼びだしをまたいで同じものを渡す. Defaults to None.
+
+    Returns:
+        Frame: 読んだフレーム。ファイルの終わりならNone。
+    """
+    if table is None:
+        table = dict()
+    frame = Frame(
+        residue_id=[],
+        residue_name=[],
+        atom_id=[],
+        atom_name=[],
+        position=[],
+        cell=None,
+    )
+
+    title = file.readline()
+    # 終了判定。1文字も読めない時はファイルの終わり。
+    if len(title) == 0:
+        return None
+    n_atom = int(file.readline())
+    if compact:
+        (
+            frame.residue_id,
+            frame.residue_name,
+            frame.atom_id,
+            frame.atom_name,
+            frame.position,
+        ) = _parse_compact(file, n_atom, table)
+        frame.name_table = np.array(list(table))
+    else:
+        for i in range(n_atom):
+            line = file.readline()
+            residue_id = int(line[0:5])
+            residue = line[5:10].strip()
+            atom = line[10:15].strip()
+            atom_id = int(line[15:20])
+            x = float(line[20:28])
+            y = float(line[28:36])
+            z = float(line[36:44])
+            # 速度は省略
+
+            frame.residue_id.append(residue_id)
+            frame.residue_name.append(residue)
+            frame.atom_name.append(atom)
+            frame.atom_id.append(atom_id)
+            frame.position.append([x, y, z])
+
+        # numpy形式に変換しておく。
+        frame.residue_id = np.array(frame.residue_id)
+        frame.residue_name = np.array(frame.residue_name)
+        frame.atom_name = np.array(frame.atom_name)
+        frame.atom_id = np.array(frame.atom_id)
+        frame.position = np.array(frame.position)
+
+    cell = [float(x) for x in file.readline().split()]
+
+    # cellは行列の形にしておく。セルは小さいので、コンパクト形式でもfloat64のまま。
+    if len(cell) == 3:
+        # 直方体セルの場合
+        cell = np.diag(cell)
+    else:
+        # 9パラメータで指定される場合は、順番がややこしい。
+        # v1(x) v2(y) v3(z) v1(y) v1(z) v2(x) v2(z) v3(x) v3(y)
+        # pairlistなどにあわせ、各行をセルベクトルとする。
+        v1 = [cell[0], cell[3], cell[4]]
+        v2 = [cell[5], cell[1], cell[6]]
+        v3 = [cell[7], cell[8], cell[2]]
+        cell = np.array([v1, v2, v3])
+
+    frame.cell = cell
+
+    if (
+        last is not None
+        and np.array_equal(last.residue_name, frame.residue_name)
+        and np.array_equal(last.atom_name, frame.atom_name)
+        and np.array_equal(last.name_table, frame.name_table)
+    ):
+        frame.residue_name = last.residue_name
+        frame.atom_name = last.atom_name
+        frame.name_table = last.name_table
+        frame.selections = last.selections
+    return frame
+
+
+def read_gro(file, compact=False):
+    """
+    gromacsの.groファイルを読みこむ。
+
+    あとで出力する場合にそなえ、できるだけデータをそのままの形で保持する。
+
+    compactなら、座標はfloat32、番号はint32とし、残基名と原子名は名前の表
+    (Frame.name_table)の番号で持つ。.groの座標は小数点以下3桁なので、
+    float32でも精度は失われない。
+    """
+
+    # トポロジーが前のフレームと同じなら、名前の配列と原子選択のキャッシュを使いまわす。
+    last = None
+    # コンパクト形式の名前の表(名前から番号へ)
+    table = dict()
+    # 無限ループ
+    while True:
+        frame = read_gro_frame(file, compact, last, table)
+        if frame is None:
+            return
+        last = frame
+        # returnの代わりにyieldを使うと、繰り返し(iterator)にできる。
+        yield frame
+
+
+def index_gro(file) -> np.ndarray:
+    """
+    .groファイルの各フレームの先頭のバイト位置を求める。
+
+    座標は読まず、行を数えて飛ばすだけなので、read_groよりずっと速い。
+
+    Args:
+        file (_type_): バイナリモードで開いた.groファイル
+
+    Returns:
+        np.ndarray: フレームの先頭の位置と、最後にファイルの終わりの位置 (フレーム数+1)
+    """
+    offsets = []
+    while True:
+        offset = file.tell()
+        offsets.append(offset)
+        title = file.readline()
+        if len(title) == 0:
+            break
+        n_atom = int(file.readline())
+        # 原子の行とセルの行
+        for i in range(n_atom + 1):
+            file.readline()
+    return np.array(offsets, dtype=np.int64)
+
+
+# def compose(mols, cell):
+#     resi_id = []
+#     residue = []
+#     atom = []
+#     atom_id = []
+#     position = []
+#     aid = 0
+#     rid = 0
+#     for name, mollist in mols.items():
+#         for mol in mollist:
+#             rid += 1
+#             for a in mol:
+#                 aid += 1
+#                 resi_id.append(rid)
+#                 residue.append(name)
+#                 atom.append(a[0])
+#                 atom_id.append(aid)
+#                 position.append(a[1])
+#     return {
+#         "resi_id": resi_id,
+#         "residue": residue,
+#         "atom": atom,
+#         "atom_id": atom_id,
+#         "position": position,
+#         "cell": cell,
+#     }
+
+
+if __name__ == "__main__":
+    for frame in read_gro(sys.stdin):
+        print(frame)
@@ -0,0 +1,213 @@
+"""解析の各段階の所要時間と件数の計測。
+
+環境変数XI_PROFILEにファイル名を指定すると計測が有効になり、終了時にフレームごとの
+記録をJSONで書きだす。無効なときは、stage()は何もしない共通のオブジェクトを返し、
+count()はすぐに戻るので、ほとんど負担にならない。
+
+使い方:
+
+    from xi.common.instrument import profiler
+
+    for frame in profiler.frames(read_gro(f)):
+        with profiler.stage("select"):
+            oxygens = frame.select(atom="OW")
+        profiler.count("atoms", len(frame.position))
+"""
+
+import atexit
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Iterable
+from logging import getLogger
+
+# 無効なときにstage()が返すもの
+_NULL = nullcontext()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.current["time"][self.name] += time.perf_counter() - self.start
+
+
+def peak_memory():
+    """プロセス開始からの最大常駐メモリ(バイト)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _resident_memory():
+    """いまの常駐メモリ(バイト)。Linuxでだけわかる。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+class _Sampler(threading.Thread):
+    """常駐メモリを一定の間隔で調べ、その最大値を覚えておく。
+
+    /proc/self/clear_refsでVmHWMをもどすとプロセス全体の最大値(ru_maxrssも)が
+    消えてしまうので、フレームごとの最大値はこうして見積もる。間隔より短い山は
+    見のがしうる。
+    """
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _resident_memory()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.peak = max(self.peak, _resident_memory())
+
+    def window(self):
+        """前回から今までの最大常駐メモリ(バイト)を返し、今から数えなおす。"""
+        current = _resident_memory()
+        peak = max(self.peak, current)
+        self.peak = current
+        return peak
+
+
+class Profiler:
+    """段階ごとの時間と件数を、フレームごとに記録する。"""
+
+    def __init__(self):
+        self.enabled = False
+        self.filename = None
+        self.records = []
+        self.current = None
+        # フレームごとの最大常駐メモリを見積もるもの(Linuxでだけ使える)
+        self.sampler = None
+
+    def enable(self, filename=None):
+        """計測を始める。filenameを指定すると、終了時にそこへ報告を書きだす。"""
+        self.enabled = True
+        self.filename = filename
+        if _resident_memory() is not None:
+            self.sampler = _Sampler()
+            self.sampler.start()
+        self._new_record()
+        if filename is not None:
+            atexit.register(self.write, filename)
+
+    def _new_record(self):
+        self.current = dict(
+            time=defaultdict(float), count=defaultdict(int), start=time.perf_counter()
+        )
+        if self.sampler is not None:
+            self.sampler.window()
+
+    def stage(self, name):
+        """with文で囲んだ部分の所要時間を、nameの段階に加算する。"""
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name)
+
+    def count(self, name, n):
+        """nameの件数にnを加える。"""
+        if not self.enabled:
+            return
+        self.current["count"][name] += int(n)
+
+    def add_time(self, name, seconds):
+        """別のプロセスやスレッドで測った時間を、いまのフレームのnameの段階に加算する。"""
+        if not self.enabled:
+            return
+        self.current["time"][name] += seconds
+
+    def reader_memory(self, nbytes):
+        """フレームを読んだ別のプロセスの最大常駐メモリ(バイト)を記録する。"""
+        if not self.enabled:
+            return
+        self.current["reader_peak_memory"] = max(
+            self.current.get("reader_peak_memory", 0), nbytes
+        )
+
+    def next_frame(self):
+        """いまのフレームの記録を閉じ、次のフレームの記録を始める。"""
+        if not self.enabled:
+            return
+        record = self.current
+        record["wall"] = time.perf_counter() - record.pop("start")
+        if self.sampler is not None:
+            # このフレームのあいだの最大常駐メモリ(一定間隔で調べた値)
+            record["peak_memory"] = self.sampler.window()
+        else:
+            # わからなければ、プロセス開始からの最大値であることを名前で示す。
+            record["running_peak_memory"] = peak_memory()
+        self.records.append(record)
+        self._new_record()
+
+    def frames(self, frames: Iterable) -> Iterable:
+        """フレームの列を包み、次のフレームを待つ時間を"read"段階として数える。
+
+        フレームの区切りもここでつける。最初のフレームの記録は、ここで読みはじめた
+        時点から始まる。無効なときはframesをそのまま返す。
+        """
+        if not self.enabled:
+            return frames
+        return self._frames(frames)
+
+    def _frames(self, frames):
+        # enable()からここまで(importなど)は、どのフレームにも数えない。
+        self._new_record()
+        iterator = iter(frames)
+        while True:
+            with self.stage("read"):
+                try:
+                    frame = next(iterator)
+                except StopIteration:
+                    return
+            yield frame
+            self.next_frame()
+
+    def report(self) -> dict:
+        """フレームごとの記録と、その合計"""
+        total = dict(time=defaultdict(float), count=defaultdict(int), wall=0.0)
+        for record in self.records:
+            for key, value in record["time"].items():
+                total["time"][key] += value
+            for key, value in record["count"].items():
+                total["count"][key] += value
+            total["wall"] += record["wall"]
+        # 合計はプロセス全体の正確な最大値。先読みのプロセスがあれば、その最大値を
+        # 加えて上限とする(共有メモリは両方に数えられる)。
+        total["peak_memory"] = peak_memory()
+        readers = [
+            record["reader_peak_memory"]
+            for record in self.records
+            if "reader_peak_memory" in record
+        ]
+        if readers:
+            total["reader_peak_memory"] = max(readers)
+            total["peak_memory"] += max(readers)
+        return dict(frames=self.records, total=total)
+
+    def write(self, filename):
+        """報告をJSONで書きだす。"""
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        getLogger().info(f"Profile written to {filename}")
+
+
+# プログラム全体で共有する計測器
+profiler = Profiler()
+if os.environ.get("XI_PROFILE"):
+    profiler.enable(os.environ["XI_PROFILE"])
@@ -0,0 +1,260 @@
+"""計算の重い内側のループ。
+
+Numbaがあれば、ループをひとつにまとめてJITコンパイルし、コアに分けて並列に
+実行する。大きな一時配列も作らない。Numbaがなければ、同じ計算をnumpyで行う。
+環境変数XI_JIT=0でJITを使わないようにできる。スレッド数はNUMBA_NUM_THREADSで
+指定する。
+
+どの関数も、jit=Trueならかならずコンパイルした版を、jit=Falseならnumpyの版を
+使う。jit=None(既定)ならJITが使えるときだけ使う。numbaのimportは重い(0.1秒あまり)
+ので、最初にJITを使うときまで遅らせる。
+
+    from xi.common import kernels
+
+    delta = kernels.bond_vectors(rel_O, edges)
+"""
+
+import os
+from importlib.util import find_spec
+from logging import getLogger
+from types import SimpleNamespace
+import numpy as np
+
+# numbaが入っているかどうか(importはしない)
+HAVE_NUMBA = find_spec("numba") is not None
+# 既定でJITを使うかどうか
+JIT = HAVE_NUMBA and os.environ.get("XI_JIT", "1") != "0"
+# コンパイルする関数。最初にJITを使うときに_compile()が用意する。
+_jitted = None
+
+
+def use_jit(jit=None) -> bool:
+    """jitの指定から、コンパイルした版を使うかどうかを決める。
+
+    使うなら、このときにnumbaをimportし、コンパイルする関数を用意する。
+    jit=Noneで、numbaは入っているがimportできないときは、JITを使うのをやめて
+    numpyの版にもどる。
+    """
+    global JIT
+    if jit is None:
+        if JIT and _jitted is None:
+            try:
+                _compile()
+            except ImportError:
+                getLogger().warning(
+                    "Failed to import numba; falling back to numpy.", exc_info=True
+                )
+                JIT = False
+        return JIT
+    if jit and not HAVE_NUMBA:
+        raise ImportError("JIT kernels require numba.")
+    if jit and _jitted is None:
+        _compile()
+    return bool(jit)
+
+
+def _compile():
+    """numbaをimportし、コンパイルする関数を定義する。
+
+    コンパイルそのものは、関数を最初に呼んだときに行われる(cache=Trueなので
+    2回目以降の実行ではディスクから読む)。
+    """
+    global _jitted
+    import numba
+
+    @numba.njit(parallel=True, cache=True)
+    def _bond_vectors(frac, edges):
+        delta = np.empty((len(edges), 3), dtype=frac.dtype)
+        for e in numba.prange(len(edges)):
+            i, j = edges[e, 0], edges[e, 1]
+            for d in range(3):
+                x = frac[j, d] - frac[i, d]
+                delta[e, d] = x - np.floor(x + 0.5)
+        return delta
+
+    @numba.njit(parallel=True, cache=True)
+    def _bond_midpoint_bins(frac, edges, cell, grid_size):
+        delta = np.empty((len(edges), 3), dtype=cell.dtype)
+        bins = np.empty((len(edges), 3), dtype=np.int64)
+        for e in numba.prange(len(edges)):
+            i, j = edges[e, 0], edges[e, 1]
+            x = np.empty(3)
+            c = np.empty(3)
+            for d in range(3):
+                x[d] = frac[j, d] - frac[i, d]
+                x[d] -= np.floor(x[d] + 0.5)
+                c[d] = frac[i, d] + x[d] / 2
+                c[d] -= np.floor(c[d])
+            for d in range(3):
+                a = 0.0
+                b = 0.0
+                for k in range(3):
+                    a += x[k] * cell[k, d]
+                    b += c[k] * cell[k, d]
+                delta[e, d] = a
+                # 0に向けて切りすてる(int()と同じ)。
+                bins[e, d] = int(b / grid_size)
+        return delta, bins
+
+    @numba.njit(parallel=True, cache=True)
+    def _site_energies(atom_pos, com, cell, celli, charges, eps, sig, econst, cutoff):
+        n = len(atom_pos)
+        n_site = atom_pos.shape[1]
+        energies = np.zeros(n)
+        pairs = np.zeros(n, dtype=np.int64)
+        for i in numba.prange(n):
+            offset = np.empty(3)
+            r = np.empty(3)
+            e = 0.0
+            for j in range(n):
+                if j == i:
+                    continue
+                # 重心の相対位置から、相手の分子のセルを決める。
+                for d in range(3):
+                    s = 0.0
+                    for k in range(3):
+                        s += (com[j, k] - com[i, k]) * celli[k, d]
+                    r[d] = np.floor(s + 0.5)
+                rr = 0.0
+                for d in range(3):
+                    offset[d] = (
+                        r[0] * cell[0, d] + r[1] * cell[1, d] + r[2] * cell[2, d]
+                    )
+                    x = com[j, d] - com[i, d] - offset[d]
+                    rr += x * x
+                if rr >= cutoff * cutoff:
+                    continue
+                pairs[i] += 1
+                # 電荷のあるサイトどうしのクーロン相互作用
+                for a in range(n_site):
+                    if charges[a] == 0:
+                        continue
+                    for b in range(n_site):
+                        if charges[b] == 0:
+                            continue
+                        rr = 0.0
+                        for d in range(3):
+                            x = atom_pos[j, a, d] - atom_pos[i, b, d] - offset[d]
+                            rr += x * x
+                        e += econst * charges[a] * charges[b] / np.sqrt(rr)
+                # 酸素どうしのLJ相互作用
+                rr = 0.0
+                for d in range(3):
+                    x = atom_pos[j, 0, d] - atom_pos[i, 0, d] - offset[d]
+                    rr += x * x
+                s6 = (sig * sig / rr) ** 3
+                e += 4 * eps * (s6 * s6 - s6)
+            energies[i] = e
+        return energies, pairs
+
+    _jitted = SimpleNamespace(
+        bond_vectors=_bond_vectors,
+        bond_midpoint_bins=_bond_midpoint_bins,
+        site_energies=_site_energies,
+    )
+
+
+def bond_vectors(frac, edges, jit=None) -> np.ndarray:
+    """辺ごとの、最小像規約による相対位置frac[j] - frac[i]
+
+    Args:
+        frac (_type_): セル相対位置 (ノード数 x 3)
+        edges (_type_): 辺(i, j)の配列 (辺数 x 2)
+        jit (bool, optional): コンパイルした版を使うかどうか. Defaults to None.
+
+    Returns:
+        np.ndarray: セル相対座標での相対位置 (辺数 x 3)
+    """
+    frac = np.asarray(frac)
+    edges = np.asarray(edges).reshape(-1, 2)
+    if use_jit(jit):
+        return _jitted.bond_vectors(frac, edges)
+    delta = frac[edges[:, 1]] - frac[edges[:, 0]]
+    delta -= np.floor(delta + 0.5)
+    return delta
+
+
+def bond_midpoint_bins(frac, edges, cell, grid_size, jit=None):
+    """辺ごとの相対位置と、辺の中点が入る格子の番号
+
+    格子の番号は、中点の絶対座標をgrid_sizeで割り、0に向けて切りすてたもの。
+
+    Args:
+        frac (_type_): セル相対位置 (ノード数 x 3)
+        edges (_type_): 辺(i, j)の配列 (辺数 x 2)
+        cell (_type_): セル行列
+        grid_size (float): 格子の大きさ(nm)
+        jit (bool, optional): コンパイルした版を使うかどうか. Defaults to None.
+
+    Returns:
+        tuple: 絶対座標での相対位置 (辺数 x 3)と、格子の番号 (辺数 x 3, int64)
+    """
+    frac = np.asarray(frac)
+    edges = np.asarray(edges).reshape(-1, 2)
+    cell = np.asarray(cell, dtype=np.float64)
+    if use_jit(jit):
+        return _jitted.bond_midpoint_bins(frac, edges, cell, grid_size)
+    delta = frac[edges[:, 1]] - frac[edges[:, 0]]
+    delta -= np.floor(delta + 0.5)
+    center = frac[edges[:, 0]] + delta / 2
+    center -= np.floor(center)
+    bins = np.trunc(center @ cell / grid_size).astype(np.int64)
+    return delta @ cell, bins
+
+
+def bin_means(bins, values):
+    """同じ格子の番号をもつ値の平均。格子は最初に現れた順にならべる。
+
+    Args:
+        bins (_type_): 格子の番号 (個数 x 3)
+        values (_type_): 値 (個数 x 3)
+
+    Returns:
+        tuple: 格子の番号 (格子数 x 3)と、格子ごとの値の平均 (格子数 x 3)
+    """
+    bins = np.asarray(bins).reshape(-1, 3)
+    values = np.asarray(values).reshape(len(bins), -1)
+    keys, first, inverse = np.unique(
+        bins, axis=0, return_index=True, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    sums = np.zeros((len(keys), values.shape[1]))
+    np.add.at(sums, inverse, values)
+    means = sums / np.bincount(inverse, minlength=len(keys))[:, None]
+    order = np.argsort(first)
+    return keys[order], means[order]
+
+
+def site_energies(atom_pos, com, cell, charges, eps, sig, econst, cutoff):
+    """各分子と、重心間距離がcutoffより近い分子との相互作用の合計(コンパイルした版)
+
+    サイト0どうしにLJ相互作用、電荷のあるサイトどうしにクーロン相互作用をはたらかせる。
+    numpyの版はenergy.interactions_tip4pice。
+
+    Args:
+        atom_pos (_type_): 三次元配列 (分子番号 x サイト x 空間次元)
+        com (_type_): 重心位置 (分子番号 x 空間次元)
+        cell (_type_): セル行列
+        charges (_type_): サイトごとの電荷
+        eps (float): LJのε
+        sig (float): LJのσ
+        econst (float): クーロン相互作用の係数
+        cutoff (float): 重心間距離の上限
+
+    Returns:
+        tuple: 分子ごとのエネルギーと、相互作用した相手の数
+    """
+    use_jit(True)
+    cell = np.asarray(cell, dtype=np.float64)
+    # Numbaのnp.linalgはscipyを要するので、逆行列はここで求めておく。
+    return _jitted.site_energies(
+        np.asarray(atom_pos, dtype=np.float64),
+        np.asarray(com, dtype=np.float64),
+        cell,
+        np.linalg.inv(cell),
+        np.asarray(charges, dtype=np.float64),
+        eps,
+        sig,
+        econst,
+        cutoff,
+    )
@@ -0,0 +1,188 @@
+"""水素結合や環の寿命を、フレームを読みながら追跡する。
+
+水素結合や環には整数のキーをつけ、フレームごとのキーの集合を整列した配列で
+あつかう。前のフレームとの差分は、整列した配列どうしの照合(searchsorted)で求める。
+
+使い方:
+
+    tracker = LifetimeTracker(max_lag=100)
+    for frame in read_gro(f):
+        ...
+        tracker.update(hb_keys(edges, n_mol))
+    tracker.finish()
+    intermittent, continuous = tracker.correlations()
+
+環のキーはフレームをまたいで同じでなければならないので、RingKeysをひとつ作って
+すべてのフレームで使う。
+
+    ring_keys = RingKeys()
+    for frame in read_gro(f):
+        ...
+        tracker.update(ring_keys(rings))
+"""
+
+from collections import deque
+from typing import Iterable, Tuple
+import numpy as np
+
+
+def hb_keys(edges, n_mol) -> np.ndarray:
+    """水素結合(供与分子, 受容分子)の配列を、整列した整数キーの配列にする。
+
+    Args:
+        edges (_type_): 辺の配列 (辺数 x 2)
+        n_mol (_type_): 分子数
+
+    Returns:
+        np.ndarray: 整列した、重複のないキーの配列(int64)
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    return np.unique(edges[:, 0] * n_mol + edges[:, 1])
+
+
+def _member(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """整列した配列aの各要素が、整列した配列bにあるかどうかと、その位置"""
+    pos = np.searchsorted(b, a)
+    found = np.zeros(len(a), dtype=bool)
+    inside = pos < len(b)
+    found[inside] = b[pos[inside]] == a[inside]
+    return found, pos
+
+
+class RingKeys:
+    """環(ノードの列)に、実行のあいだ変わらない整数キーをつける。
+
+    環はノードを整列した組で区別する(向きや始点にはよらない)。大きさごとに、これまでに
+    現れた組の整列した表とそのキーを持ち、はじめて現れた組には新しい番号をつける。
+    同じ組にはかならず同じキーが、違う組にはかならず違うキーがつく。表は現れた環の
+    種類の数だけ大きくなる。
+    """
+
+    def __init__(self):
+        # 大きさごとの、整列した組の表(組をひとつの要素とする構造化配列)とキー
+        self.tables = dict()
+        self.n_keys = 0
+
+    def __call__(self, rings: Iterable) -> np.ndarray:
+        """環の列を、整列した整数キーの配列にする。
+
+        Args:
+            rings (Iterable): 環の列。cyclessのcycles_iterの結果など。
+
+        Returns:
+            np.ndarray: 整列した、重複のないキーの配列(int64)
+        """
+        rings = [sorted(ring) for ring in rings]
+        keys = [np.zeros(0, dtype=np.int64)]
+        # 同じ大きさの環ごとにまとめて、組を辞書式順序で表と照合する。
+        for size in sorted(set(len(ring) for ring in rings)):
+            rows = np.array(
+                [ring for ring in rings if len(ring) == size], dtype=np.int64
+            )
+            dtype = np.dtype([(f"f{i}", np.int64) for i in range(size)])
+            rows = np.unique(rows.view(dtype).ravel())
+            table, ids = self.tables.get(
+                size, (np.zeros(0, dtype=dtype), np.zeros(0, dtype=np.int64))
+            )
+            found, pos = _member(rows, table)
+            new = np.arange(self.n_keys, self.n_keys + np.count_nonzero(~found))
+            self.n_keys += len(new)
+            row_ids = np.empty(len(rows), dtype=np.int64)
+            row_ids[found] = ids[pos[found]]
+            row_ids[~found] = new
+            # 新しい組を、整列した順を保つ位置に挿入する。
+            self.tables[size] = (
+                np.insert(table, pos[~found], rows[~found]),
+                np.insert(ids, pos[~found], new),
+            )
+            keys.append(row_ids)
+        return np.unique(np.concatenate(keys))
+
+
+class LifetimeTracker:
+    """キーの集合の時系列から、寿命の分布と生存相関関数を逐次求める。
+
+    連続相関は、時刻t-τからtまでとぎれずに存在した項目の数、間欠相関は、時刻
+    t-τとtの両方に存在した項目の数を、時間原点について平均したもの。
+    いま存在する項目と直近max_lagフレームのキーだけを保持する。
+    """
+
+    def __init__(self, max_lag: int = 100, max_lifetime: int = 1000):
+        """
+        Args:
+            max_lag (int, optional): 相関関数を求める最大のずれ(フレーム数). Defaults to 100.
+            max_lifetime (int, optional): 寿命のヒストグラムの上限。これより長いものは
+                最後のビンにまとめる. Defaults to 1000.
+        """
+        self.max_lag = max_lag
+        self.n_frame = 0
+        # いま存在する項目のキー(整列済み)と、とぎれずに存在しはじめたフレーム
+        self.active = np.zeros(0, dtype=np.int64)
+        self.birth = np.zeros(0, dtype=np.int64)
+        # 消滅した項目の寿命(フレーム数)の分布
+        self.lifetimes = np.zeros(max_lifetime + 1, dtype=np.int64)
+        self.history = deque(maxlen=max_lag)
+        self.intermittent = np.zeros(max_lag + 1)
+        self.continuous = np.zeros(max_lag + 1)
+        # ずれごとの時間原点の数
+        self.origins = np.zeros(max_lag + 1)
+
+    def _record(self, ages):
+        self.lifetimes += np.bincount(
+            np.minimum(ages, len(self.lifetimes) - 1), minlength=len(self.lifetimes)
+        )
+
+    def update(self, keys):
+        """次のフレームのキーの集合を与える。
+
+        Args:
+            keys (_type_): このフレームに存在する項目のキー。hb_keys()やRingKeysの結果。
+        """
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        t = self.n_frame
+
+        # 消滅した項目の寿命を記録する。
+        alive, _ = _member(self.active, keys)
+        self._record(t - self.birth[~alive])
+
+        # 前から存在した項目は誕生時刻をひきつぐ。
+        found, pos = _member(keys, self.active)
+        birth = np.full(len(keys), t, dtype=np.int64)
+        birth[found] = self.birth[pos[found]]
+        self.active = keys
+        self.birth = birth
+
+        # 連続相関: 年齢がτ以上の項目の数
+        ages = np.minimum(t - birth, self.max_lag)
+        counts = np.bincount(ages, minlength=self.max_lag + 1)
+        self.continuous += np.cumsum(counts[::-1])[::-1]
+        # 間欠相関: τフレーム前にも存在した項目の数
+        self.intermittent[0] += len(keys)
+        for lag, past in enumerate(reversed(self.history), start=1):
+            self.intermittent[lag] += np.count_nonzero(_member(keys, past)[0])
+        self.origins[: min(t, self.max_lag) + 1] += 1
+
+        self.history.append(keys)
+        self.n_frame += 1
+
+    def finish(self):
+        """最後のフレームまで存在した項目も、そこまでの長さを寿命として記録する。
+
+        これらの本当の寿命はもっと長いかもしれない(打ち切り)。記録した項目は
+        存在しないものとしてあつかうので、二度呼んでも二重には数えない。
+        """
+        self._record(self.n_frame - self.birth)
+        self.active = np.zeros(0, dtype=np.int64)
+        self.birth = np.zeros(0, dtype=np.int64)
+
+    def correlations(self) -> Tuple[np.ndarray, np.ndarray]:
+        """間欠相関関数と連続相関関数。τ=0で1に規格化する。
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 長さmax_lag+1の配列二つ。
+                まだ求まっていないずれの値はnan。
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            intermittent = self.intermittent / self.origins
+            continuous = self.continuous / self.origins
+            return intermittent / intermittent[0], continuous / continuous[0]
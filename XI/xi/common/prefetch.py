@@ -0,0 +1,257 @@
+"""フレームの先読み。
+
+解析とファイルの読みこみを重ねるために、別プロセスで次のフレームを読んでおく。
+read_groの構文解析はPythonのループでGILをにぎったままなので、スレッドでは解析と
+重ならない。読みこみ側のプロセスはフレームをFramePoolの共有メモリに置いて記述子だけを
+キューで送り、解析側はattach()でコピーなしにFrameを組みたてる。
+別プロセスに渡せないフレームの源(標準入力や、pickleできない関数・イテレータ)は、
+スレッドで先読みする。展開やファイルの読みこみのようにGILを手ばなす部分だけは重なる。
+"""
+
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from functools import partial
+from multiprocessing import resource_tracker
+from typing import Callable, Iterable, Iterator, Union
+from logging import getLogger
+
+from xi.common.gromacs2 import read_gro
+from xi.common.compressed import open_trajectory
+from xi.common.instrument import peak_memory, profiler
+from xi.common.sharedframe import FramePool, attach, detach
+
+
+class _Raised:
+    """読みこみ側で発生した例外を解析側に渡すための箱"""
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def _read_file(filename, compact):
+    """ファイルのフレームを順に返す。先読みの源として別プロセスに渡せる。"""
+    with open_trajectory(filename) as f:
+        yield from read_gro(f, compact=compact)
+
+
+def _frames(source, compact=False):
+    """フレームの源を、フレームのイテレータを返す引数なしの関数にそろえる。
+
+    Returns:
+        tuple: その関数と、pickleして別プロセスに渡せるかどうか
+    """
+    if isinstance(source, (str, os.PathLike)):
+        # 標準入力は別プロセスでは読めない。
+        return partial(_read_file, source, compact), source != "-"
+    if not callable(source):
+        source = partial(iter, source)
+    try:
+        pickle.dumps(source)
+    except Exception:
+        return source, False
+    return source, True
+
+
+def _timed(frames):
+    """フレームと、その読みこみにかかった時間(秒)の組を順に返す。"""
+    iterator = iter(frames)
+    while True:
+        start = time.perf_counter()
+        try:
+            frame = next(iterator)
+        except StopIteration:
+            return
+        yield frame, time.perf_counter() - start
+
+
+def _produce(source, depth, descriptors, returned):
+    """読みこみ側のプロセス。
+
+    source()の返すフレームを順に読み、descriptorsにはフレームの記述子と、その
+    読みこみの時間・このプロセスの最大常駐メモリの組を、読み終わったらNoneを送る。returnedからは解析側が使いおえた記述子を受けとり、
+    Noneが来たら(解析側がやめたら)終わる。
+    """
+    logger = getLogger()
+    outstanding = 0
+
+    def wait_return():
+        # 解析側から記述子がもどるのを待つ。やめる合図ならFalse。
+        nonlocal outstanding
+        descriptor = returned.get()
+        if descriptor is None:
+            return False
+        pool.release(descriptor)
+        outstanding -= 1
+        return True
+
+    with FramePool() as pool:
+        try:
+            for frame, elapsed in _timed(source()):
+                # 解析中の1フレームのほかに、depth個より先には読まない(背圧)。
+                while outstanding > depth:
+                    if not wait_return():
+                        return
+                descriptors.put((pool.put(frame), elapsed, peak_memory()))
+                outstanding += 1
+            descriptors.put(None)
+        except BaseException as e:
+            logger.debug("Failed to read frames.", exc_info=True)
+            try:
+                descriptors.put(_Raised(e))
+            except Exception:
+                descriptors.put(_Raised(RuntimeError(repr(e))))
+        # 解析側がすべてのブロックを使いおえるまで、共有メモリを消さない。
+        while outstanding > 0:
+            if not wait_return():
+                return
+
+
+def _produce_thread(source, frames, stop):
+    """読みこみ側のスレッド。
+
+    framesにフレームとその読みこみの時間の組を、読み終わったらNoneを送る。
+    """
+    logger = getLogger()
+
+    def put(item):
+        # 解析側がやめたら(stop)、待つのをやめる。
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        for item in _timed(source()):
+            if not put(item):
+                return
+        put(None)
+    except BaseException as e:
+        logger.debug("Failed to read frames.", exc_info=True)
+        put(_Raised(e))
+
+
+def _prefetch_thread(source, depth):
+    """スレッドでdepth個先までフレームを読みすすめながら、順に返す。"""
+    frames = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_produce_thread, args=(source, frames, stop), daemon=True
+    )
+    thread.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            if isinstance(item, _Raised):
+                raise item.exception
+            frame, elapsed = item
+            profiler.add_time("parse", elapsed)
+            yield frame
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _context():
+    """読みこみ側のプロセスを起こす方法
+
+    解析側ではNumba(TBB)や展開のスレッドが動いていることがあり、forkは安全でない
+    (TBBのスレッドのある状態でforkすると、終了時に止まる)。使えればforkserverにする。
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def _cpu_count():
+    """このプロセスが使えるCPUの数"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def prefetch(
+    source: Union[str, Callable[[], Iterable], Iterable],
+    compact: bool = False,
+    depth: int = 2,
+) -> Iterator:
+    """別プロセスでdepth個先までフレームを読みすすめながら、順に返す。
+
+    sourceには、ファイル名のほか、フレームのイテレータを返す引数なしの関数
+    (functools.partial(GroTrajectory, filename)など)や、フレームのイテラブル
+    (GroTrajectoryなど)を渡せる。関数やイテラブルは読みこみ側で呼ばれる。
+    返したFrameの配列は共有メモリのビューで、次のフレームを要求した時点で
+    読みこみ側に返却され、上書きされうる。フレームをまたいで配列を使うときはコピーすること。
+    読みこみ側の例外は解析側でもう一度送出される。読みこみ側で測った構文解析の時間
+    ("parse"段階)と最大常駐メモリは、profilerのそのフレームの記録に加える。解析側が途中でやめた場合
+    (例外やbreak)は読みこみ側も止める。標準入力("-")やpickleできない源(ラムダや
+    ジェネレータ)は別プロセスに渡せないので、スレッドで先読みする。使えるCPUが
+    一つなら重ならないので、先読みせずにそのまま読む。
+
+    Args:
+        source (str | Callable | Iterable): .groファイルの名前(圧縮されていてもよい)、
+            フレームのイテレータを返す関数、またはフレームのイテラブル。
+        compact (bool, optional): read_groのコンパクト形式。sourceがファイル名の
+            ときだけ使う. Defaults to False.
+        depth (int, optional): 先読みするフレーム数. Defaults to 2.
+
+    Yields:
+        Frame: 読みこんだフレーム
+    """
+    logger = getLogger()
+    if _cpu_count() < 2:
+        yield from _frames(source, compact)[0]()
+        return
+    source, portable = _frames(source, compact)
+    if not portable:
+        logger.debug("Prefetching frames in a thread.")
+        yield from _prefetch_thread(source, depth)
+        return
+
+    # 共有メモリの登録を両方のプロセスで同じresource_trackerに送る。別々だと、解析側の
+    # trackerが、読みこみ側の消したブロックを終了時に消そうとして警告を出す。
+    resource_tracker.ensure_running()
+    context = _context()
+    descriptors = context.Queue()
+    returned = context.Queue()
+    process = context.Process(
+        target=_produce,
+        args=(source, depth, descriptors, returned),
+        daemon=True,
+    )
+    process.start()
+    try:
+        while True:
+            try:
+                item = descriptors.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError("The frame reader process died.")
+                continue
+            if item is None:
+                return
+            if isinstance(item, _Raised):
+                raise item.exception
+            descriptor, elapsed, memory = item
+            # 読みこみ側で測った値を、このフレームの記録に加える。
+            profiler.add_time("parse", elapsed)
+            profiler.reader_memory(memory)
+            yield attach(descriptor)
+            returned.put(descriptor)
+    finally:
+        # 読みこみ側に終わりを知らせる。
+        detach()
+        returned.put(None)
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        logger.debug("prefetch process finished.")
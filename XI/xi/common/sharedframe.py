@@ -0,0 +1,281 @@
+"""共有メモリによるFrameのうけわたし。
+
+フレームをワーカープロセスに渡すとき、Frameをまるごとpickleするかわりに、
+座標・セル・トポロジーをmultiprocessing.shared_memoryに置き、小さな記述子
+(FrameDescriptor)だけを送る。ワーカーはattach()で、コピーなしのnumpy配列を
+もつFrameを組みたてる。
+
+使い方:
+
+    with FramePool() as pool, ProcessPoolExecutor() as executor:
+        for frame in read_gro(f):
+            descriptor = pool.put(frame)
+            future = executor.submit(analyze, descriptor)
+            future.add_done_callback(lambda _, d=descriptor: pool.release(d))
+
+analyzeの中ではframe = attach(descriptor)とする。attach()したFrameの配列は、
+release()されるまでしか使えない。ワーカーでの処理がすべて終わったらdetach()を呼ぶ。
+"""
+
+import sys
+import threading
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Tuple, Dict
+import numpy as np
+from logging import getLogger
+
+from xi.common.gromacs2 import Frame
+
+# 配列の先頭をそろえる単位
+_ALIGN = 64
+
+
+@dataclass(frozen=True)
+class FrameDescriptor:
+    """共有メモリ上のフレームの記述子。これだけがワーカーに送られる。"""
+
+    # 座標・セル・番号を置いたブロック
+    block: str
+    # 残基名・原子名(コンパクト形式ではその番号と名前の表)を置いたブロック
+    topology: str
+    n_atom: int
+    # 配列ごとの(オフセット, dtype, shape)
+    layout: Tuple
+
+
+def _layout(specs):
+    """配列を並べたときの各配列の位置と、全体の大きさ"""
+    layout = []
+    offset = 0
+    for dtype, shape in specs:
+        layout.append((offset, np.dtype(dtype).str, tuple(shape)))
+        size = np.dtype(dtype).itemsize * int(np.prod(shape))
+        offset += (size + _ALIGN - 1) // _ALIGN * _ALIGN
+    return tuple(layout), max(offset, 1)
+
+
+def _views(buf, layout):
+    return [
+        np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+        for offset, dtype, shape in layout
+    ]
+
+
+class FramePool:
+    """フレーム用の共有メモリブロックを管理する(親プロセス側)。
+
+    release()されたブロックは捨てずにとっておき、次のput()で使いまわす。
+    トポロジー(残基名・原子名と、あれば名前の表)は、同じ配列をもつフレームどうしで一つのブロックを
+    共有する。read_groはトポロジーが変わらないかぎり同じ配列を使いまわすので、
+    トポロジーのコピーはふつう一度しか起こらない。トポロジーが変わると、古いトポロジーの
+    ブロックは、それを使う記述子がすべてrelease()された時点で破棄する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = []
+        self._busy: Dict[str, shared_memory.SharedMemory] = dict()
+        # 名前の配列のidをキーとする。配列そのものも、idが再利用されないよう持っておく。
+        self._topologies = dict()
+        # 使用中のブロックごとの、そのフレームのトポロジーのキー
+        self._busy_topology = dict()
+        # 最後にput()したフレームのトポロジーのキー。使用中でなくても破棄しない。
+        self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _allocate(self, size):
+        with self._lock:
+            # 足りる大きさのうち、いちばん小さいブロックを使う。
+            candidates = [shm for shm in self._free if shm.size >= size]
+            if candidates:
+                shm = min(candidates, key=lambda shm: shm.size)
+                self._free.remove(shm)
+            else:
+                shm = shared_memory.SharedMemory(create=True, size=size)
+                getLogger().debug(f"New shared memory block {shm.name} ({size} B)")
+            self._busy[shm.name] = shm
+        return shm
+
+    def _evict(self):
+        """いまのトポロジーでなく、使用中のブロックからも参照されないトポロジーを捨てる。
+
+        self._lockをにぎって呼ぶこと。
+
+        Returns:
+            list: 閉じるべき共有メモリブロック
+        """
+        used = set(self._busy_topology.values())
+        used.add(self._current)
+        stale = [key for key in self._topologies if key not in used]
+        return [self._topologies.pop(key)[1] for key in stale]
+
+    def _topology(self, frame: Frame):
+        names = [frame.residue_name, frame.atom_name]
+        if frame.name_table is not None:
+            names.append(frame.name_table)
+        key = tuple(id(array) for array in names)
+        with self._lock:
+            if key in self._topologies:
+                self._current = key
+                return key, self._topologies[key][0]
+        arrays = [np.asarray(array) for array in names]
+        layout, size = _layout([(a.dtype, a.shape) for a in arrays])
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        for view, array in zip(_views(shm.buf, layout), arrays):
+            view[...] = array
+        with self._lock:
+            self._topologies[key] = ((shm.name, layout), shm, names)
+            self._current = key
+            stale = self._evict()
+        _destroy(stale)
+        return key, (shm.name, layout)
+
+    def put(self, frame: Frame) -> FrameDescriptor:
+        """フレームを共有メモリにコピーし、記述子を返す。
+
+        Args:
+            frame (Frame): コピーするフレーム
+
+        Returns:
+            FrameDescriptor: ワーカーに送る記述子
+        """
+        position = np.asarray(frame.position)
+        n_atom = position.shape[0]
+        key, (topology, topology_layout) = self._topology(frame)
+        arrays = (
+            position,
+            np.asarray(frame.cell, dtype=np.float64),
+            np.asarray(frame.residue_id),
+            np.asarray(frame.atom_id),
+        )
+        layout, size = _layout([(a.dtype, a.shape) for a in arrays])
+        shm = self._allocate(size)
+        with self._lock:
+            self._busy_topology[shm.name] = key
+        for view, array in zip(_views(shm.buf, layout), arrays):
+            view[...] = array
+        return FrameDescriptor(
+            block=shm.name,
+            topology=topology,
+            n_atom=n_atom,
+            layout=layout + topology_layout,
+        )
+
+    def release(self, descriptor: FrameDescriptor):
+        """ワーカーが使いおえたブロックを返却し、再利用できるようにする。"""
+        with self._lock:
+            shm = self._busy.pop(descriptor.block)
+            self._free.append(shm)
+            del self._busy_topology[descriptor.block]
+            stale = self._evict()
+        _destroy(stale)
+
+    def close(self):
+        """すべてのブロックを破棄する。"""
+        with self._lock:
+            blocks = list(self._free) + list(self._busy.values())
+            blocks += [shm for _, shm, _ in self._topologies.values()]
+            self._free = []
+            self._busy = dict()
+            self._topologies = dict()
+            self._busy_topology = dict()
+            self._current = None
+        _destroy(blocks)
+
+
+def _destroy(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+# ワーカー側で開いたブロック。いまのフレームが使わないものは、次のattach()で閉じる。
+_attached: Dict[str, shared_memory.SharedMemory] = dict()
+# 開いた直後の、ブロックのmmapの参照数。これより多ければ、配列がまだ使われている。
+_unused_refcount: Dict[str, int] = dict()
+# いまのトポロジーの名前の配列と原子選択のキャッシュ
+_topology_cache = dict()
+
+
+def _open(name):
+    if name not in _attached:
+        try:
+            # Python 3.13以降。ワーカーの終了時にブロックを消されないようにする。
+            _attached[name] = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            _attached[name] = shared_memory.SharedMemory(name=name)
+        _unused_refcount[name] = sys.getrefcount(_attached[name]._mmap)
+    return _attached[name]
+
+
+def _close_stale(current=()):
+    """currentにないブロックを閉じる。
+
+    前のフレームの配列(やそのビュー)がまだどこかで使われているブロックは、閉じると
+    その配列が無効なメモリをさすので、残しておいて次の機会にもう一度試す。
+    numpyの配列はブロックのmmapを直接参照するので、その参照数で使用中かどうかがわかる。
+    """
+    for name in list(_attached):
+        if name in current:
+            continue
+        shm = _attached[name]
+        if sys.getrefcount(shm._mmap) > _unused_refcount[name]:
+            continue
+        try:
+            shm.close()
+        except BufferError:
+            continue
+        del _attached[name]
+        del _unused_refcount[name]
+
+
+def detach():
+    """ワーカー側で開いているブロックをすべて閉じる。
+
+    attach()したFrameをもう使わなくなってから呼ぶ。まだ使われている配列のブロックは
+    閉じずに残る。
+    """
+    _topology_cache.clear()
+    _close_stale()
+
+
+def attach(descriptor: FrameDescriptor) -> Frame:
+    """記述子から、共有メモリ上の配列を直接参照するFrameを組みたてる(ワーカー側)。
+
+    Args:
+        descriptor (FrameDescriptor): FramePool.put()が返した記述子
+
+    Returns:
+        Frame: 配列はコピーではなく共有メモリのビュー
+    """
+    # 前のフレームのブロックは、このフレームも使うものを除いて閉じる。
+    for key in list(_topology_cache):
+        if key[0] != descriptor.topology:
+            del _topology_cache[key]
+    _close_stale((descriptor.block, descriptor.topology))
+    position, cell, residue_id, atom_id = _views(
+        _open(descriptor.block).buf, descriptor.layout[:4]
+    )
+    key = (descriptor.topology, descriptor.layout[4:])
+    if key not in _topology_cache:
+        names = _views(_open(descriptor.topology).buf, descriptor.layout[4:])
+        # 名前の表がなければNone
+        names.append(None)
+        _topology_cache[key] = (names[0], names[1], names[2], dict())
+    residue_name, atom_name, name_table, selections = _topology_cache[key]
+    return Frame(
+        residue_id=residue_id,
+        residue_name=residue_name,
+        atom_id=atom_id,
+        atom_name=atom_name,
+        position=position,
+        cell=cell,
+        name_table=name_table,
+        selections=selections,
+    )
@@ -0,0 +1,231 @@
+"""人工的な氷・水の配置を作る。
+
+性能測定や動作確認のために、任意の大きさの氷Ih・氷Icの格子と、それを乱した
+水のような配置を、TIP4P型の4サイト水(OW, HW1, HW2, MW)のFrameとして作る。
+水素の向きは氷の規則(各分子が2本の水素結合を供与し、2本を受容する)を満たす。
+
+    python -m xi.common.synth --lattice Ih --molecules 10000 > ice.gro
+"""
+
+import sys
+import numpy as np
+import click
+from logging import getLogger
+import pairlist as pl
+
+from xi.common.gromacs2 import Frame
+
+# 単位胞。各行がセルベクトル(nm)で、酸素の位置はセル相対座標。
+_sqrt3 = np.sqrt(3)
+_a_ih, _c_ih = 0.4511, 0.7346
+_a_ic = 0.6358
+LATTICES = {
+    # 六方晶の単位胞(三斜セル)
+    "Ih": (
+        np.array([[_a_ih, 0, 0], [-_a_ih / 2, _a_ih * _sqrt3 / 2, 0], [0, 0, _c_ih]]),
+        np.array(
+            [
+                [1 / 3, 2 / 3, 0],
+                [2 / 3, 1 / 3, 1 / 2],
+                [1 / 3, 2 / 3, 3 / 8],
+                [2 / 3, 1 / 3, 7 / 8],
+            ]
+        ),
+    ),
+    # ダイヤモンド構造
+    "Ic": (
+        np.diag([_a_ic, _a_ic, _a_ic]),
+        np.array(
+            [
+                [0, 0, 0],
+                [0, 1 / 2, 1 / 2],
+                [1 / 2, 0, 1 / 2],
+                [1 / 2, 1 / 2, 0],
+                [1 / 4, 1 / 4, 1 / 4],
+                [1 / 4, 3 / 4, 3 / 4],
+                [3 / 4, 1 / 4, 3 / 4],
+                [3 / 4, 3 / 4, 1 / 4],
+            ]
+        ),
+    ),
+}
+
+
+def _ortho_ih():
+    """直方体セルの氷Ih。六方晶の単位胞2つ分で、a1+a2だけずらしたものを重ねる。"""
+    hexagonal, frac = LATTICES["Ih"]
+    cell = np.diag([_a_ih, _a_ih * _sqrt3, _c_ih])
+    x = frac @ hexagonal
+    x = np.concatenate([x, x + hexagonal[0] + hexagonal[1]])
+    return cell, (x @ np.linalg.inv(cell)) % 1
+
+
+LATTICES["Ih-ortho"] = _ortho_ih()
+
+# TIP4P/Iceの幾何
+OH = 0.09572
+OM = 0.01577
+
+
+def _replicate(lattice, n_molecules):
+    """単位胞をならべて、分子数がおよそn_moleculesになるセルを作る。"""
+    unit, frac = LATTICES[lattice]
+    volume = abs(np.linalg.det(unit)) * n_molecules / len(frac)
+    # セルの厚み
+    widths = abs(np.linalg.det(unit)) / np.linalg.norm(
+        np.cross(unit[[1, 2, 0]], unit[[2, 0, 1]]), axis=1
+    )
+    # 立方体に近くなるように、各方向の繰りかえし数を決める。
+    # 周期境界で隣の分子が重複しないよう、少なくとも2つはならべる。
+    reps = np.maximum(2, np.round(volume ** (1 / 3) / widths)).astype(int)
+    grid = np.array(np.meshgrid(*[np.arange(r) for r in reps], indexing="ij"))
+    grid = grid.reshape(3, -1).T
+    frac = (grid[:, None, :] + frac[None, :, :]).reshape(-1, 3) / reps
+    return frac, unit * reps[:, None]
+
+
+def _balanced_orientation(pairs, n, rng):
+    """4配位のグラフの辺に、各頂点の入次数と出次数がともに2になるよう向きをつける。
+
+    各頂点から、未使用の辺をたどれなくなるまでたどり、たどった向きを辺の向きとする。
+    どの頂点も次数が偶数なので、たどりはじめた頂点で必ず閉じる。
+
+    Returns:
+        np.ndarray: 向きをつけた辺 (辺数 x 2)
+    """
+    u, v = pairs[:, 0], pairs[:, 1]
+    n_edge = len(pairs)
+    # 頂点ごとの接続辺のリスト。順番をまぜておくと向きが乱雑になる。
+    incident = np.concatenate([np.arange(n_edge), np.arange(n_edge)])
+    ends = np.concatenate([u, v])
+    shuffle = rng.permutation(len(incident))
+    incident, ends = incident[shuffle], ends[shuffle]
+    order = np.argsort(ends, kind="stable")
+    incident = incident[order].tolist()
+    start = np.searchsorted(ends[order], np.arange(n + 1)).tolist()
+    pointer = start[:-1]
+    used = [False] * n_edge
+    u, v = u.tolist(), v.tolist()
+    directed = []
+    for origin in range(n):
+        node = origin
+        while True:
+            # まだ使っていない辺をさがす。
+            p = pointer[node]
+            while p < start[node + 1] and used[incident[p]]:
+                p += 1
+            pointer[node] = p
+            if p == start[node + 1]:
+                # 行きづまるのは出発点だけで、出発点の辺もこれで使いきっている。
+                break
+            edge = incident[p]
+            used[edge] = True
+            other = u[edge] + v[edge] - node
+            directed.append((node, other))
+            node = other
+    return np.array(directed)
+
+
+def _random_rotations(n, rng):
+    """一様ランダムな回転行列 (n x 3 x 3)"""
+    q = rng.normal(size=(n, 4))
+    q /= np.linalg.norm(q, axis=1)[:, None]
+    w, x, y, z = q.T
+    return np.array(
+        [
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ]
+    ).transpose(2, 0, 1)
+
+
+def ice_frame(
+    lattice="Ic",
+    n_molecules=1000,
+    disorder=False,
+    resname="water",
+    seed=0,
+) -> Frame:
+    """氷(またはそれを乱した水)の配置を作る。
+
+    Args:
+        lattice (str, optional): "Ic", "Ih"(三斜セル), "Ih-ortho"(直方体セル). Defaults to "Ic".
+        n_molecules (int, optional): おおよその分子数. Defaults to 1000.
+        disorder (bool, optional): Trueなら、分子の位置をずらし、向きをランダムにして
+            水のような乱れた配置にする. Defaults to False.
+        resname (str, optional): 残基名. Defaults to "water".
+        seed (int, optional): 乱数の種. Defaults to 0.
+
+    Returns:
+        Frame: 4サイト水の配置
+    """
+    logger = getLogger()
+    rng = np.random.default_rng(seed)
+    frac, cell = _replicate(lattice, n_molecules)
+    n = len(frac)
+    logger.info(f"{lattice}: {n} molecules")
+
+    # 隣接分子(距離0.3 nm以内)に水素を向ける。
+    pairs = np.asarray(pl.pairs_iter(frac, 0.3, cell, distance=False))
+    assert len(pairs) == 2 * n, "Not a four-coordinated lattice."
+    directed = _balanced_orientation(pairs, n, rng)
+    donor = directed[:, 0]
+    # 各分子が供与する2本の辺
+    order = np.argsort(donor, kind="stable")
+    targets = directed[order, 1].reshape(n, 2)
+    d = frac[targets] - frac[:, None, :]
+    d -= np.floor(d + 0.5)
+    d = d @ cell
+    d /= np.linalg.norm(d, axis=2)[:, :, None]
+    oxygen = frac @ cell
+    hydrogens = d * OH
+    if disorder:
+        # 位置をずらし、分子を回転する。
+        oxygen += rng.normal(scale=0.03, size=oxygen.shape)
+        hydrogens = np.einsum("nij,nkj->nki", _random_rotations(n, rng), hydrogens)
+    bisector = hydrogens.sum(axis=1)
+    bisector /= np.linalg.norm(bisector, axis=1)[:, None]
+    position = np.stack(
+        [
+            oxygen,
+            oxygen + hydrogens[:, 0],
+            oxygen + hydrogens[:, 1],
+            oxygen + bisector * OM,
+        ],
+        axis=1,
+    ).reshape(-1, 3)
+
+    # .groの番号は5桁なので、桁あふれしたら0に戻す。
+    return Frame(
+        residue_id=np.repeat(np.arange(1, n + 1) % 100000, 4),
+        residue_name=np.full(4 * n, resname),
+        atom_id=np.arange(1, 4 * n + 1) % 100000,
+        atom_name=np.tile(np.array(["OW", "HW1", "HW2", "MW"]), n),
+        position=position,
+        cell=cell,
+    )
+
+
+@click.command()
+@click.option(
+    "--lattice",
+    type=click.Choice(list(LATTICES)),
+    default="Ic",
+    help="Ice lattice (Ih is in a triclinic cell).",
+)
+@click.option("--molecules", default=1000, help="Approximate number of molecules.")
+@click.option(
+    "--disorder", is_flag=True, help="Perturb into a water-like configuration."
+)
+@click.option("--frames", default=1, help="Number of frames.")
+@click.option("--seed", default=0, help="Random seed.")
+def main(lattice, molecules, disorder, frames, seed):
+    """Write synthetic ice/water frames in .gro format to stdout."""
+    for i in range(frames):
+        frame = ice_frame(lattice, molecules, disorder=disorder, seed=seed + i)
+        frame.write_gro(sys.stdout, remark=f"Synthetic {lattice} frame {i}")
+
+
+if __name__ == "__main__":
+    main()
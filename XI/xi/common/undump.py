@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 
 # make a table from the output of gmx dump
-# usage gmx dump -e 00001.edr | python undump.py
+# usage gmx dump -e 00001.edr | xi-undump
 
 
-import re
-import sys
-
+import click
 import numpy as np
 
+from xi.common.compressed import open_trajectory
+
 # import json
 
 units = {
@@ -113,9 +113,17 @@ def undump_edr(file):
     return np.array(table)
 
 
-if __name__ == "__main__":
-    table = undump_edr(sys.stdin)
+@click.command()
+@click.argument("dump_file", type=click.Path(exists=True, allow_dash=True), default="-")
+def main(dump_file):
+    """Make a table from the output of gmx dump -e."""
+    with open_trajectory(dump_file) as f:
+        table = undump_edr(f)
     print("#"+"\t".join(columns))
     print("#"+"\t".join([units[column] for column in columns]))
     for row in table:
         print("\t".join([f"{value}" for value in row]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# 6員環の実効双極子の向きをyaplotで表示する。
+
+import logging
+from logging import getLogger, INFO
+
+import click
+import numpy as np
+
+# .groを読みこむ
+from xi.common.graph2 import gro2atoms, hb_edges, center_of_mass_batch
+from xi.common import kernels
+from xi.common.prefetch import prefetch
+from xi.common.instrument import profiler
+
+logger = getLogger(__name__)
+
+
+@click.command()
+@click.argument("gro_file", default="00400.40.gro", type=click.Path(exists=True))
+@click.option(
+    "--memory-budget",
+    type=int,
+    default=None,
+    help="Detect hydrogen bonds in spatial chunks within this many bytes.",
+)
+@click.option(
+    "--compact",
+    is_flag=True,
+    help="Hold coordinates in float32 and names as small integer codes.",
+)
+def main(gro_file, memory_budget, compact):
+    """Show the effective dipoles of six-membered rings in yaplot format."""
+    import networkx as nx
+    import yaplotlib as yap
+    from cycless import rings
+
+    logging.basicConfig(level=INFO)
+    # 解析しているあいだに、別プロセスで次のフレームを読んでおく。
+    for frame in profiler.frames(prefetch(gro_file, compact=compact)):
+        profiler.count("atoms", len(frame.position))
+        # 酸素と水素のセル相対座標。原子の選択はトポロジーごとにキャッシュされる。
+        with profiler.stage("select"):
+            rel_O, rel_H, cell = gro2atoms(frame)
+
+        # 水素結合ネットワークを再構成
+        # 辺は受容分子から供与分子に向ける。
+        with profiler.stage("pairs_iter"):
+            HB = hb_edges(rel_O, rel_H, cell, memory_budget=memory_budget)
+        with profiler.stage("graph"):
+            DG = nx.DiGraph(HB[:, ::-1].tolist())
+        profiler.count("hb_edges", DG.number_of_edges())
+
+        # yaplotの1フレームを開始。矢印の表現を指定。
+        s = yap.ArrowType(2)
+        # 矢印の幅を指定
+        s += yap.Size(0.05)
+        # 六角形の輪を集める。
+        cnt = 0
+        paths = []
+        orientations = []
+        with profiler.stage("rings"):
+            for ring in rings.cycle_orientations_iter(DG, maxsize=6, pos=rel_O):
+                cnt += 1
+                cycle_size = len(ring.path)
+                if cycle_size != 6:
+                    continue
+                logger.debug(ring)
+                paths.append(ring.path)
+                orientations.append(ring.ori)
+        profiler.count("rings", cnt)
+
+        with profiler.stage("dipole"):
+            paths = np.array(paths, dtype=np.int64).reshape(-1, 6)
+            # 有向グラフ上の六角形に関して、重心座標を絶対座標系で求める。
+            centers = center_of_mass_batch(
+                np.arange(0, paths.size + 1, 6), paths.reshape(-1), rel_O, cell
+            )
+            centers = (centers - np.floor(centers)) @ cell
+
+            # 六角形に沿ったベクトルの輪。分極した輪では0にならない。
+            # 辺の向きが輪の向きと逆なら符号を反転する。
+            edges = np.stack([paths, np.roll(paths, -1, axis=1)], axis=2)
+            dipoles = kernels.bond_vectors(rel_O, edges.reshape(-1, 2))
+            # cyclessのring.ori[k]は辺(path[k-1], path[k])の向きなので、
+            # 辺(path[k], path[k+1])にはori[k+1]を対応させる。
+            signs = np.roll(
+                np.where(np.array(orientations, dtype=bool), 1, -1).reshape(-1, 6),
+                -1,
+                axis=1,
+            )
+            dipoles = dipoles.reshape(-1, 6, 3) * signs.reshape(-1, 6, 1)
+            net_dipoles = dipoles.sum(axis=1) @ cell * 0.15
+
+        for center, net_dipole in zip(centers, net_dipoles):
+            s += yap.Arrow(center - net_dipole, center + net_dipole)
+
+        with profiler.stage("yaplot"):
+            print(s + yap.NewPage())
+
+
+if __name__ == "__main__":
+    main()
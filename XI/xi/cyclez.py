@@ -0,0 +1,216 @@
+# cyclessを使い、6員環の矢印の向きの統計をzスライスごとにとる。
+
+from collections import defaultdict
+import sys
+
+import click
+import numpy as np
+
+# .groを読みこむ
+from xi.common.graph2 import gro2atoms, hb_edges
+from xi.common.prefetch import prefetch
+from xi.common.instrument import profiler
+
+
+def plot_cycles(zticks, ratios_4, ratios_5, ratios_6, ratios_7, bin_width, show):
+    """サイクルサイズ別の比率グラフ"""
+    # 描画しないときには読みこまずにすませる。
+    import matplotlib.pyplot as plt
+
+    plt.figure()
+    plt.bar(zticks, ratios_4, width=bin_width, label="4-membered")
+    plt.bar(
+        zticks,
+        ratios_5,
+        width=bin_width,
+        label="5-membered",
+        bottom=ratios_4,
+    )
+    plt.bar(
+        zticks,
+        ratios_6,
+        width=bin_width,
+        label="6-membered",
+        bottom=[r4 + r5 for r4, r5 in zip(ratios_4, ratios_5)],
+    )
+    plt.bar(
+        zticks,
+        ratios_7,
+        width=bin_width,
+        label="7-membered",
+        bottom=[r4 + r5 + r6 for r4, r5, r6 in zip(ratios_4, ratios_5, ratios_6)],
+    )
+    plt.xlabel("z (nm)")
+    plt.ylabel("ratio")
+    plt.title("Ratio of cycles per z-slice")
+    plt.legend()
+    with profiler.stage("plot"):
+        plt.savefig("cycles.pdf")
+        plt.savefig("cycles.png")
+    if show:
+        plt.show()
+
+
+def plot_rings(zticks, ratios, bin_width, show):
+    """リングコード別の比率グラフ"""
+    import matplotlib.pyplot as plt
+
+    plt.figure()
+    plt.bar(zticks, ratios[0], width=bin_width, label="0")
+    bottom = ratios[0]
+    plt.bar(zticks, ratios[1], width=bin_width, label="1", bottom=bottom)
+    bottom = [bottom[i] + ratios[1][i] for i in range(len(bottom))]
+    plt.bar(zticks, ratios[3], width=bin_width, label="3", bottom=bottom)
+    bottom = [bottom[i] + ratios[3][i] for i in range(len(bottom))]
+    plt.bar(zticks, ratios[5], width=bin_width, label="5", bottom=bottom)
+    bottom = [bottom[i] + ratios[5][i] for i in range(len(bottom))]
+    plt.bar(zticks, ratios[7], width=bin_width, label="7", bottom=bottom)
+    bottom = [bottom[i] + ratios[7][i] for i in range(len(bottom))]
+    plt.bar(zticks, ratios[9], width=bin_width, label="9", bottom=bottom)
+    bottom = [bottom[i] + ratios[9][i] for i in range(len(bottom))]
+    plt.bar(
+        zticks,
+        ratios[11],
+        width=bin_width,
+        label="11",
+        bottom=bottom,
+    )
+    bottom = [bottom[i] + ratios[11][i] for i in range(len(bottom))]
+    plt.bar(
+        zticks,
+        ratios[21],
+        width=bin_width,
+        label="21",
+        bottom=bottom,
+    )
+    plt.xlabel("z (nm)")
+    plt.ylabel("ratio")
+    plt.title("Ratio of cycles per z-slice")
+    plt.legend()
+    with profiler.stage("plot"):
+        plt.savefig("rings.pdf")
+        plt.savefig("rings.png")
+    if show:
+        plt.show()
+
+
+def print_ratios(zticks, labels, ratios, file=sys.stdout):
+    """比率の表を書きだす。"""
+    print("# z(nm)\t" + "\t".join(labels), file=file)
+    for z, row in zip(zticks, zip(*ratios)):
+        print(f"{z:.3f}\t" + "\t".join(f"{r:.4f}" for r in row), file=file)
+    print(file=file)
+
+
+@click.command()
+@click.argument("gro_file", default="00400.40.gro", type=click.Path(exists=True))
+@click.option(
+    "--plot/--no-plot",
+    default=True,
+    help="Draw the graphs, or print the ratios as text instead.",
+)
+@click.option("--show/--no-show", default=True, help="Show the graphs on screen.")
+@click.option(
+    "--memory-budget",
+    type=int,
+    default=None,
+    help="Detect hydrogen bonds in spatial chunks within this many bytes.",
+)
+@click.option(
+    "--compact",
+    is_flag=True,
+    help="Hold coordinates in float32 and names as small integer codes.",
+)
+def main(gro_file, plot, show, memory_budget, compact):
+    """Ratios of ring sizes and six-membered ring codes per z-slice."""
+    import networkx as nx
+    from cycless import cycles, rings
+
+    # 解析しているあいだに、別プロセスで次のフレームを読んでおく。
+    for frame in profiler.frames(prefetch(gro_file, compact=compact)):
+        profiler.count("atoms", len(frame.position))
+        # 酸素と水素のセル相対座標。原子の選択はトポロジーごとにキャッシュされる。
+        with profiler.stage("select"):
+            rel_O, rel_H, cell = gro2atoms(frame)
+
+        # 水素結合ネットワークを再構成
+        # 辺は受容分子から供与分子に向ける。
+        with profiler.stage("pairs_iter"):
+            HB = hb_edges(rel_O, rel_H, cell, memory_budget=memory_budget)
+            HB = HB[:, ::-1].tolist()
+        profiler.count("hb_edges", len(HB))
+
+        with profiler.stage("graph"):
+            G = nx.Graph(HB)
+        bin_width = 0.5  # nm
+        zbins = [
+            {4: 0, 5: 0, 6: 0, 7: 0} for i in range(int(cell[2, 2] / bin_width) + 1)
+        ]
+        zticks = np.arange(0, cell[2, 2], bin_width)
+        if True:  # for debug
+            with profiler.stage("rings"):
+                for cycle in cycles.cycles_iter(G, maxsize=7, pos=rel_O):
+                    profiler.count("rings", 1)
+                    cycle_size = len(cycle)
+                    center = cycles.centerOfMass(cycle, rel_O) @ cell
+                    bin = int(center[2] / bin_width)
+                    if 4 <= cycle_size <= 7:
+                        zbins[bin][cycle_size] += 1
+
+            # 各binの合計を計算して比率に変換
+            totals = [bin[4] + bin[5] + bin[6] + bin[7] for bin in zbins]
+            ratios_4, ratios_5, ratios_6, ratios_7 = [
+                [
+                    bin[size] / total if total > 0 else 0
+                    for bin, total in zip(zbins, totals)
+                ]
+                for size in (4, 5, 6, 7)
+            ]
+            if plot:
+                plot_cycles(
+                    zticks,
+                    ratios_4,
+                    ratios_5,
+                    ratios_6,
+                    ratios_7,
+                    bin_width,
+                    show,
+                )
+            else:
+                print_ratios(
+                    zticks,
+                    ["4", "5", "6", "7"],
+                    [ratios_4, ratios_5, ratios_6, ratios_7],
+                )
+
+        with profiler.stage("graph"):
+            DG = nx.DiGraph(HB)
+        zbins = [defaultdict(int) for i in range(int(cell[2, 2] / bin_width) + 1)]
+        with profiler.stage("rings"):
+            for ring in rings.cycle_orientations_iter(DG, maxsize=6, pos=rel_O):
+                profiler.count("oriented_rings", 1)
+                cycle_size = len(ring.path)
+                if cycle_size != 6:
+                    continue
+                center = cycles.centerOfMass(ring.path, rel_O) @ cell
+                bin = int(center[2] / bin_width)
+                zbins[bin][ring.code] += 1
+
+        # 各binの合計を計算して比率に変換
+        codes = [0, 1, 3, 5, 7, 9, 11, 21]
+        totals = [sum(bin[code] for code in codes) for bin in zbins]
+        ratios = {}
+        for code in codes:
+            ratios[code] = [
+                bin[code] / total if total > 0 else 0
+                for bin, total in zip(zbins, totals)
+            ]
+
+        if plot:
+            plot_rings(zticks, ratios, bin_width, show)
+        else:
+            print_ratios(zticks, [str(code) for code in codes], list(ratios.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# グリッドごとの実効双極子の向きをyaplotで表示する。
+
+import logging
+from logging import getLogger, INFO
+
+import click
+
+# .groを読みこむ
+from xi.common.graph2 import gro2atoms, hb_edges
+from xi.common import kernels
+from xi.common.prefetch import prefetch
+from xi.common.instrument import profiler
+
+logger = getLogger(__name__)
+
+
+@click.command()
+@click.argument("gro_file", default="00400.40.gro", type=click.Path(exists=True))
+@click.option(
+    "--memory-budget",
+    type=int,
+    default=None,
+    help="Detect hydrogen bonds in spatial chunks within this many bytes.",
+)
+@click.option(
+    "--compact",
+    is_flag=True,
+    help="Hold coordinates in float32 and names as small integer codes.",
+)
+def main(gro_file, memory_budget, compact):
+    """Show the effective dipoles per grid cell in yaplot format."""
+    import yaplotlib as yap
+
+    logging.basicConfig(level=INFO)
+    # 解析しているあいだに、別プロセスで次のフレームを読んでおく。
+    for frame in profiler.frames(prefetch(gro_file, compact=compact)):
+        profiler.count("atoms", len(frame.position))
+        # 酸素と水素のセル相対座標。原子の選択はトポロジーごとにキャッシュされる。
+        with profiler.stage("select"):
+            rel_O, rel_H, cell = gro2atoms(frame)
+
+        # 水素結合ネットワークを再構成
+        # 辺は受容分子から供与分子に向ける。
+        with profiler.stage("pairs_iter"):
+            HB = hb_edges(rel_O, rel_H, cell, memory_budget=memory_budget)
+        profiler.count("hb_edges", len(HB))
+
+        grid_size = 0.7  # nm
+
+        with profiler.stage("dipole"):
+            # 受容分子から供与分子へのベクトルを、結合の中点が入る格子ごとに平均する。
+            deltas, bins = kernels.bond_midpoint_bins(
+                rel_O, HB[:, ::-1], cell, grid_size
+            )
+            grids, means = kernels.bin_means(bins, deltas)
+
+        # yaplotの1フレームを開始。矢印の表現を指定。
+        s = yap.ArrowType(2)
+        # 矢印の幅を指定
+        s += yap.Size(0.05)
+        for grid, mean in zip(grids, means):
+            dipole = mean * 3
+            center = grid * grid_size
+            s += yap.Arrow(center - dipole, center + dipole)
+
+        with profiler.stage("yaplot"):
+            print(s + yap.NewPage())
+
+
+if __name__ == "__main__":
+    main()